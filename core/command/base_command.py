@@ -1,14 +1,25 @@
 import asyncio
+import hashlib
+import json
+import shutil
+import time
 from pathlib import Path
 from typing import Literal
 
-from astrbot.api import AstrBotConfig
+from astrbot.api import AstrBotConfig, html_renderer, logger
+from astrbot.api.star import StarTools
 
-from ..function import Cache
+from ..function import AssetServer, Cache
 from ..network import AnimeTrece, Downloader, TouchGal, Vndb
 from ..services import Services
-from ..type.exceptions import ArgsOrNullException
-from ..type.inner_models import CommandType, bs64, template_list
+from ..type.exceptions import ArgsOrNullException, RenderBusyException
+from ..type.inner_models import (
+    CommandType,
+    bs64,
+    current_priority,
+    image_sizes,
+    template_list,
+)
 from ..type.outer_models import (
     ResourceResponse,
     TouchGalResponse,
@@ -16,17 +27,33 @@ from ..type.outer_models import (
     VNDBProducerResponse,
     VNDBVnResponse,
 )
-from ..utils import File, Splicer
+from ..utils import (
+    File,
+    Font,
+    Image,
+    LRUCache,
+    PillowRenderer,
+    PriorityLimiter,
+    Splicer,
+)
 
 
 class BaseCommand:
     resources_dir = Path(__file__).parent / ".." / ".." / "resources"
     template_dir = resources_dir / "template"
+    font_path = resources_dir / "font" / "hpsimplifiedhans-regular.ttf"
+    bg_path = resources_dir / "image" / "pixiv139681518.jpg"
+    render_path = StarTools.get_data_dir("astrbot_plugin_galgame_box") / "render"
+    # 本地绘制的文件在渲染缓存过期后再保留一段时间，留给发送图片
+    render_grace = 300
+    prune_interval = 60
 
     templates = {}
+    template_hashes = {}
     is_init = False
 
     render_options = {"type": "jpeg", "quality": 100}
+    output_formats = ("jpeg", "png")
     support_forward = ["aiocqhttp", "qq_official", "onebot"]
 
     # 解决静态类型检查器警告
@@ -35,9 +62,25 @@ class BaseCommand:
     touchgal: TouchGal | None = None
     animetrace: AnimeTrece | None = None
     cache: Cache | None = None
+    assets: AssetServer | None = None
     bg: str | None = None
     font: str | None = None
+    enable_font: bool | None = None
+    font_data: bytes | None = None
+    fonts: LRUCache | None = None
     err_image: str | None = None
+    rendered: LRUCache | None = None
+    native_commands: set[str] | None = None
+    render_fallback: bool | None = None
+    renders: PriorityLimiter | None = None
+    command_options: dict[str, dict] | None = None
+    target_size: int | None = None
+    max_width: int | None = None
+    max_height: int | None = None
+    webp_platforms: set[str] | None = None
+    render_keep: int | None = None
+    render_pruned: float = 0
+    prune_task: asyncio.Task | None = None
 
     session_timeout: int | None = None
     forward_limit: int | None = None
@@ -53,9 +96,10 @@ class BaseCommand:
             BaseCommand.animetrace = Services.get(AnimeTrece)
 
             BaseCommand.cache = Services.get(Cache)
+            BaseCommand.assets = Services.get(AssetServer)
 
             basic = config.get("basicSetting", {})
-            enable_font = basic.get("enableFont", True)
+            BaseCommand.enable_font = basic.get("enableFont", True)
             BaseCommand.session_timeout = basic.get("sessionTimeout", 30)
             BaseCommand.forward_limit = basic.get("forwardLimit", 10)
             BaseCommand.results_limit = basic.get("resultsLimit", False)
@@ -63,44 +107,337 @@ class BaseCommand:
                 "characterOptions", []
             )
 
-            BaseCommand.bg = await File.read_buffer2base64(
-                BaseCommand.resources_dir / "image" / "pixiv139681518.jpg"
+            BaseCommand.bg = await BaseCommand._static_asset(
+                "bg", BaseCommand.bg_path, "jpg"
             )
-            BaseCommand.font = (
-                await File.read_buffer2base64(
-                    BaseCommand.resources_dir / "font" / "hpsimplifiedhans-regular.ttf"
-                )
-                if enable_font
-                else ""
+            # 优先按每次渲染实际用到的字符裁剪字体，缺少fonttools时才内嵌完整字体
+            BaseCommand.font = ""
+            if BaseCommand.enable_font:
+                if Font.available():
+                    BaseCommand.font_data = await File.read_buffer(
+                        BaseCommand.font_path
+                    )
+                    BaseCommand.fonts = LRUCache(16 * 1024 * 1024)
+                else:
+                    logger.warning(
+                        "目前未安装fonttools模块，将内嵌完整字体，可以减小渲染负载通过：pip install fonttools brotli"
+                    )
+                    BaseCommand.font = await BaseCommand._static_asset(
+                        "font", BaseCommand.font_path, "ttf"
+                    )
+            BaseCommand.err_image = await BaseCommand._static_asset(
+                "error", BaseCommand.cache.err_path, "jpg"
             )
-            BaseCommand.err_image = BaseCommand.cache.err_image
 
             for file in set(template_list.values()):
                 BaseCommand.templates[file] = await File.read_text(
                     BaseCommand.template_dir / file
                 )
+                BaseCommand.template_hashes[file] = hashlib.blake2b(
+                    BaseCommand.templates[file].encode(), digest_size=16
+                ).hexdigest()
+
+            cache_setting = config.get("cacheSetting", {})
+            render_ttl = cache_setting.get("renderCacheTtl", 600)
+            # 相同模板与数据的渲染结果直接复用
+            BaseCommand.rendered = LRUCache(
+                cache_setting.get("renderCacheEntries", 128) if render_ttl > 0 else 0,
+                ttl=render_ttl,
+            )
+            BaseCommand.render_keep = max(0, render_ttl) + BaseCommand.render_grace
+
+            render_setting = config.get("renderSetting", {})
+            BaseCommand.native_commands = {
+                i.split("-")[0] for i in render_setting.get("nativeRenderCommands", [])
+            }
+            BaseCommand.render_fallback = render_setting.get("renderFallback", True)
+            # 限制同时进行的渲染，交互指令优先于预取与定时推送
+            BaseCommand.renders = PriorityLimiter(
+                render_setting.get("renderConcurrency", 2),
+                render_setting.get("renderQueueLimit", 16),
+            )
+            quality = render_setting.get("outputQuality", 100)
+            BaseCommand.render_options = BaseCommand._parse_output(
+                render_setting.get("outputFormat", "a-jpeg").split("-")[-1], quality
+            ) or {"type": "jpeg", "quality": 100}
+            BaseCommand.command_options = {}
+            for entry in render_setting.get("commandOutput", []):
+                # 格式为 指令-格式-质量，质量可省略
+                parts = entry.strip().split("-")
+                options = (
+                    BaseCommand._parse_output(
+                        parts[1], parts[2] if len(parts) > 2 else quality
+                    )
+                    if len(parts) > 1
+                    else None
+                )
+                if options is None:
+                    logger.warning(f"忽略无效的指令输出配置：{entry}")
+                    continue
+                BaseCommand.command_options[parts[0]] = options
+
+            # 发送前按目标大小与分辨率重新编码，0为不限制
+            BaseCommand.target_size = render_setting.get("adaptiveTargetSize", 0) * 1024
+            BaseCommand.max_width = render_setting.get("adaptiveMaxWidth", 0)
+            BaseCommand.max_height = render_setting.get("adaptiveMaxHeight", 0)
+            BaseCommand.webp_platforms = set(render_setting.get("webpPlatforms", []))
+
+            # 本地绘制结果只在渲染缓存有效期内使用，启动时清空上次遗留的文件
+            await asyncio.to_thread(
+                shutil.rmtree, BaseCommand.render_path, ignore_errors=True
+            )
+            BaseCommand.render_path.mkdir(parents=True, exist_ok=True)
 
             BaseCommand.is_init = True
 
+    @staticmethod
+    def _parse_output(fmt: str, quality: int | str) -> dict | None:
+        fmt = fmt.strip().lower().replace("jpg", "jpeg")
+        if fmt not in BaseCommand.output_formats:
+            return None
+        if fmt == "png":
+            # png不支持quality参数
+            return {"type": "png"}
+        try:
+            return {"type": fmt, "quality": min(100, max(1, int(quality)))}
+        except ValueError:
+            return None
+
+    @property
+    def adaptive(self) -> bool:
+        return bool(self.target_size or self.max_width or self.max_height)
+
+    async def render(
+        self, cmd_type: CommandType, data: dict, platform: str = ""
+    ) -> str:
+        """platform为消息平台名称，用于决定重新编码时能否使用WebP"""
+        template = template_list[cmd_type.value]
+        options = self.command_options.get(cmd_type.value, self.render_options)
+        webp = self.adaptive and platform in self.webp_platforms
+        key = self._render_key(template, data, options, webp)
+
+        url = self.rendered.get(key)
+        if url is not None:
+            return url
+
+        if self.renders.full():
+            self.renders.reject()
+            raise RenderBusyException(self.renders.stats()["waiting"])
+        async with self.renders.slot(current_priority.get()) as waited:
+            stats = self.renders.stats()
+            logger.debug(
+                f"渲染排队{waited:.2f}s，当前运行{stats['running']}个，排队{stats['waiting']}个"
+            )
+            # 排队期间可能已有相同内容渲染完成
+            url = self.rendered.get(key)
+            if url is None:
+                url, fallback = await self._render_uncached(
+                    cmd_type, template, data, key, options
+                )
+                if self.adaptive:
+                    url = await self._reencode(url, key, webp)
+                # 网页渲染失败时的本地绘制结果不缓存，渲染服务恢复后重新渲染
+                if not fallback:
+                    self.rendered.set(key, url)
+        return url
+
+    async def _render_uncached(
+        self,
+        cmd_type: CommandType,
+        template: str,
+        data: dict,
+        key: str,
+        options: dict,
+    ) -> tuple[str, bool]:
+        """返回渲染结果与是否为网页渲染失败后的本地绘制"""
+        quality = options.get("quality", 90)
+        if cmd_type.value in self.native_commands:
+            return await self._render_native(template, data, key, quality), False
+        # 字体裁剪在本地进行，失败不代表渲染服务不可用
+        if self.font_data:
+            data = {**data, "font": await self._subset_font(template, data)}
+        try:
+            return await self._render_html(template, data, options), False
+        except Exception as e:
+            if not self.render_fallback:
+                raise
+            logger.warning(f"网页渲染失败，改用本地绘制：{e}")
+            return await self._render_native(template, data, key, quality), True
+
+    async def _render_html(self, template: str, data: dict, options: dict) -> str:
+        return await html_renderer.render_custom_template(
+            self.templates[template], data, True, options
+        )
+
+    async def _reencode(self, url: str, key: str, webp: bool) -> str:
+        """按目标大小与分辨率重新编码渲染结果，失败时原样返回"""
+        if url.startswith("http"):
+            buffer = await self.downloader.download_image(url)
+        else:
+            buffer = await File.read_buffer(url)
+        if not buffer:
+            return url
+
+        fmt = "WEBP" if webp else "JPEG"
+        try:
+            encoded = await Image.compress_async(
+                buffer, self.target_size, self.max_width, self.max_height, fmt
+            )
+        except Exception as e:
+            logger.warning(f"渲染结果重新编码失败：{e}")
+            return url
+        if len(encoded) >= len(buffer) and not webp:
+            return url
+
+        path = self.render_path / f"{key}.{fmt.lower().replace('jpeg', 'jpg')}"
+        await File.write_buffer(path, encoded)
+        self._schedule_prune()
+        return str(path)
+
+    async def _render_native(
+        self, template: str, data: dict, key: str, quality: int = 90
+    ) -> str:
+        """用Pillow在本地绘制，返回图片文件路径"""
+        urls = {
+            i
+            for i in self._collect_urls(data)
+            if i not in (self.bg, self.font, self.err_image)
+        }
+        buffers = await asyncio.gather(
+            *(self.downloader.download_image(i) for i in urls)
+        )
+        images = {url: buffer for url, buffer in zip(urls, buffers) if buffer}
+
+        renderer = PillowRenderer(
+            self.font_path, self.bg_path, self.cache.err_path, images
+        )
+        buffer = await renderer.render_async(template, data, quality)
+        path = self.render_path / f"{key}.jpg"
+        await File.write_buffer(path, buffer)
+        self._schedule_prune()
+        return str(path)
+
+    def _schedule_prune(self):
+        """定期在后台删除渲染缓存已失效的本地文件"""
+        now = time.monotonic()
+        if now - BaseCommand.render_pruned < self.prune_interval:
+            return
+        BaseCommand.render_pruned = now
+        if self.prune_task is None or self.prune_task.done():
+            BaseCommand.prune_task = asyncio.create_task(
+                asyncio.to_thread(
+                    self._prune_render_files, self.render_path, self.render_keep
+                )
+            )
+
+    @staticmethod
+    def _prune_render_files(path: Path, keep: float):
+        deadline = time.time() - keep
+        for file in path.iterdir():
+            try:
+                if file.stat().st_mtime < deadline:
+                    file.unlink()
+            except OSError:
+                pass
+
+    @classmethod
+    def _collect_urls(cls, value, is_image: bool = False) -> list[str]:
+        """收集渲染数据中图片字段里需要下载的链接"""
+        if isinstance(value, str):
+            return [value] if is_image and value.startswith("http") else []
+        if isinstance(value, dict):
+            return [
+                i
+                for k, v in value.items()
+                for i in cls._collect_urls(v, k in ("image", "main_image", "previews"))
+            ]
+        if isinstance(value, (list, tuple)):
+            return [i for v in value for i in cls._collect_urls(v, is_image)]
+        return []
+
+    def _render_key(self, template: str, data: dict, options: dict, webp: bool) -> str:
+        # 字体与背景在插件生命周期内不变，由模板与字体开关区分即可
+        payload = {k: v for k, v in data.items() if k not in ("font", "bg")}
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(
+            json.dumps(
+                [
+                    template,
+                    self.template_hashes[template],
+                    self.enable_font,
+                    options,
+                    webp,
+                    self.adaptive,
+                    self._fingerprint(payload),
+                ],
+                sort_keys=True,
+                ensure_ascii=False,
+            ).encode()
+        )
+        return digest.hexdigest()
+
+    async def _subset_font(self, template: str, data: dict) -> bs64:
+        chars = Font.collect_chars(data)
+        chars.update(self.templates[template])
+        key = hashlib.blake2b(
+            "".join(sorted(chars)).encode(), digest_size=16
+        ).hexdigest()
+
+        buffer = self.fonts.get(key)
+        if buffer is None:
+            try:
+                buffer = await Font.subset_async(self.font_data, chars)
+            except Exception as e:
+                logger.warning(f"字体裁剪失败，改用完整字体：{e}")
+                return await self._static_asset("font", self.font_path, "ttf")
+            self.fonts.set(key, buffer, size=len(buffer))
+        if self.assets.enabled:
+            return self.assets.register("font", buffer, Font.flavor())
+        return await File.buffer2base64(buffer, suffix=Font.flavor())
+
+    @staticmethod
+    async def _static_asset(stem: str, path: Path, suffix: str) -> str:
+        """启用静态资源服务时返回链接，否则返回data URI"""
+        if BaseCommand.assets.enabled:
+            return BaseCommand.assets.register(
+                stem, await File.read_buffer(path), suffix, pinned=True
+            )
+        return await File.read_buffer2base64(path)
+
+    @classmethod
+    def _fingerprint(cls, value):
+        """图片等长字符串以内容哈希代替，避免渲染键过大"""
+        if isinstance(value, str):
+            if len(value) <= 256:
+                return value
+            return hashlib.blake2b(value.encode(), digest_size=16).hexdigest()
+        if isinstance(value, dict):
+            return {k: cls._fingerprint(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [cls._fingerprint(v) for v in value]
+        return value
+
     async def read_or_download_images(
-        self, group: Literal["vndb", "touchgal"], url: str, prefix: bool = True
+        self,
+        group: Literal["vndb", "touchgal"],
+        url: str,
+        prefix: bool = True,
+        width: int | None = None,
     ) -> bs64:
-        cache_data = await self.cache.read_cache(group, url, prefix=prefix)
+        cache_data = await self.cache.load(
+            group, url, self.downloader.fetch, prefix=prefix, width=width
+        )
         if cache_data is None:
-            buffer = await self.downloader.download_image(url)
-            return (
-                await self.cache.write_cache(group, url, buffer, prefix=prefix)
-                if buffer
-                else self.err_image
-            )
-        else:
-            return cache_data
+            return self.err_image if prefix else self.cache.err_image.split(",", 1)[1]
+        return cache_data
 
     async def build_vndb_images(
-        self, response: list[VNDBVnResponse | VNDBCharacterResponse]
+        self,
+        response: list[VNDBVnResponse | VNDBCharacterResponse],
+        width: int | None = image_sizes["card"],
     ) -> list[bs64]:
         co_str = [
-            self.read_or_download_images("vndb", i.image.url)
+            self.read_or_download_images("vndb", i.image.url, width=width)
             if i.image
             else asyncio.sleep(0, result=self.err_image)
             for i in response
@@ -112,9 +449,11 @@ class BaseCommand:
         urls: list[str],
         cache_group: Literal["vndb", "touchgal"],
         prefix: bool = True,
+        width: int | None = None,
     ) -> list[bs64]:
         co_str = [
-            self.read_or_download_images(cache_group, i, prefix=prefix) for i in urls
+            self.read_or_download_images(cache_group, i, prefix=prefix, width=width)
+            for i in urls
         ]
         return await asyncio.gather(*co_str)
 
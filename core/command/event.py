@@ -1,10 +1,10 @@
 import asyncio
 from datetime import datetime
 
-from astrbot.api import AstrBotConfig, html_renderer
+from astrbot.api import AstrBotConfig
 from astrbot.api.event import AstrMessageEvent
 
-from ..type.inner_models import CommandType, ja_weeks, template_list
+from ..type.inner_models import CommandType, ja_weeks
 from ..type.outer_models import VNDBCharacterResponse, VNDBVnResponse
 from .base_command import BaseCommand
 
@@ -25,11 +25,7 @@ class Event(BaseCommand):
 
         vns, characters = await self.vndb.request_by_event(date)
         data = await self.build(date, vns, characters)
-        tmpl = self.templates[template_list[CommandType.EVENT.value]]
-
-        url = await html_renderer.render_custom_template(
-            tmpl, data, True, self.render_options
-        )
+        url = await self.render(CommandType.EVENT, data, event.get_platform_name())
         yield event.image_result(url)
 
     async def build(
@@ -1,12 +1,11 @@
 from datetime import datetime
 
-from astrbot.api import AstrBotConfig, html_renderer
+from astrbot.api import AstrBotConfig
 
 from ..services import Services
 from ..type.exceptions import NoResultException
-from ..type.inner_models import CommandType, template_list
+from ..type.inner_models import CommandType, Priority, current_priority, image_sizes
 from ..type.outer_models import TouchGalResponse, VNDBCharacterResponse, VNDBVnResponse
-from ..utils import HTMLHandler
 from .base_command import BaseCommand
 from .random import Random
 
@@ -22,27 +21,27 @@ class EventTimed(BaseCommand):
     async def goooooooooo(self):
         now = datetime.now().strftime("%Y-%m-%d")
         date = now.split("-")
-        tmpl = self.templates[template_list[CommandType.EVENT_TIMED.value]]
 
+        # 定时推送不与用户指令争抢渲染
+        token = current_priority.set(Priority.BACKGROUND)
         try:
-            vn = await self.vndb.request_by_event_vn(date)
-            vn_data = await self.build(vn, for_vn=True)
-            vn_url = await html_renderer.render_custom_template(
-                tmpl, vn_data, True, self.render_options
-            )
-            res1 = vn_url
-        except Exception as e:
-            res1 = e
+            try:
+                vn = await self.vndb.request_by_event_vn(date)
+                vn_data = await self.build(vn, for_vn=True)
+                vn_url = await self.render(CommandType.EVENT_TIMED, vn_data)
+                res1 = vn_url
+            except Exception as e:
+                res1 = e
 
-        try:
-            cha = await self.vndb.request_by_event_cha(date)
-            cha_data = await self.build(cha)
-            cha_url = await html_renderer.render_custom_template(
-                tmpl, cha_data, True, self.render_options
-            )
-            res2 = cha_url
-        except Exception as e:
-            res2 = e
+            try:
+                cha = await self.vndb.request_by_event_cha(date)
+                cha_data = await self.build(cha)
+                cha_url = await self.render(CommandType.EVENT_TIMED, cha_data)
+                res2 = cha_url
+            except Exception as e:
+                res2 = e
+        finally:
+            current_priority.reset(token)
         yield res1, res2
 
     async def build(
@@ -75,8 +74,9 @@ class EventTimed(BaseCommand):
         touchgal_vn: TouchGalResponse | None,
     ):
         if touchgal_vn:
-            text = await self.touchgal.request_html(touchgal_vn.uniqueId)
-            desc = (await HTMLHandler.handle_touchgal_details(text)).description
+            desc = (
+                await self.touchgal.request_details(touchgal_vn.uniqueId)
+            ).description
         else:
             desc = "TouchGal暂无该作品简介。"
 
@@ -90,7 +90,11 @@ class EventTimed(BaseCommand):
         ]
 
         main_image = (
-            (await self.build_images([vn.image.url], "vndb"))[0]
+            (
+                await self.build_images(
+                    [vn.image.url], "vndb", width=image_sizes["main"]
+                )
+            )[0]
             if vn.image
             else self.err_image
         )
@@ -119,7 +123,11 @@ class EventTimed(BaseCommand):
         ]
 
         main_image = (
-            (await self.build_images([cha.image.url], "vndb"))[0]
+            (
+                await self.build_images(
+                    [cha.image.url], "vndb", width=image_sizes["main"]
+                )
+            )[0]
             if cha.image
             else self.err_image
         )
@@ -3,7 +3,7 @@ from io import BytesIO
 
 from openpyxl.drawing.image import PILImage
 
-from astrbot.api import AstrBotConfig, html_renderer
+from astrbot.api import AstrBotConfig
 from astrbot.api import message_components as comp
 from astrbot.api.event import AstrMessageEvent
 from astrbot.core.utils.session_waiter import (
@@ -12,7 +12,7 @@ from astrbot.core.utils.session_waiter import (
 )
 
 from ..type.exceptions import NoResultException, SessionTimeoutException
-from ..type.inner_models import CommandType, bs64, template_list
+from ..type.inner_models import CommandType, bs64, image_sizes
 from ..type.outer_models import (
     AnimeTraceData,
     AnimeTraceResponse,
@@ -83,11 +83,7 @@ class Find(BaseCommand):
             vndb_resp.append(await asyncio.gather(*chas_per_match))
 
         data = await self.build(url, trace_resp, vndb_resp)
-        tmpl = self.templates[template_list[CommandType.FIND.value]]
-
-        res_url = await html_renderer.render_custom_template(
-            tmpl, data, True, self.render_options
-        )
+        res_url = await self.render(CommandType.FIND, data, event.get_platform_name())
         yield event.image_result(res_url)
 
     async def build(
@@ -147,7 +143,11 @@ class Find(BaseCommand):
                     character, ignore_name=True, ignore_extra=True
                 )
                 img = (
-                    (await self.build_images([character.image.url], "vndb"))[0]
+                    (
+                        await self.build_images(
+                            [character.image.url], "vndb", width=image_sizes["card"]
+                        )
+                    )[0]
                     if character.image
                     else self.err_image
                 )
@@ -1,7 +1,7 @@
-from astrbot.api import AstrBotConfig, html_renderer
+from astrbot.api import AstrBotConfig
 from astrbot.api.event import AstrMessageEvent
 
-from ..type.inner_models import CommandType, template_list
+from ..type.inner_models import CommandType
 from ..type.outer_models import VNDBProducerResponse, VNDBVnResponse
 from .base_command import BaseCommand
 
@@ -16,11 +16,7 @@ class Producer(BaseCommand):
     async def goooooooooo(self, event: AstrMessageEvent, value: str):
         pro, vns = await self.vndb.request_by_producer(value)
         data = await self.build(pro, vns)
-        tmpl = self.templates[template_list[CommandType.PRODUCER.value]]
-
-        url = await html_renderer.render_custom_template(
-            tmpl, data, True, self.render_options
-        )
+        url = await self.render(CommandType.PRODUCER, data, event.get_platform_name())
         yield event.image_result(url)
 
     async def build(
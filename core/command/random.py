@@ -1,9 +1,8 @@
-from astrbot.api import AstrBotConfig, html_renderer
+from astrbot.api import AstrBotConfig
 from astrbot.api.event import AstrMessageEvent
 
-from ..type.inner_models import CommandType, TouchGalDetails, template_list
+from ..type.inner_models import CommandType, TouchGalDetails, image_sizes
 from ..type.outer_models import TouchGalResponse
-from ..utils import HTMLHandler
 from .base_command import BaseCommand
 
 
@@ -18,11 +17,7 @@ class Random(BaseCommand):
         unique_id = await self.touchgal.request_random()
 
         data = await self.build_html(unique_id)
-        tmpl = self.templates[template_list[CommandType.RANDOM.value]]
-
-        url = await html_renderer.render_custom_template(
-            tmpl, data, True, self.render_options
-        )
+        url = await self.render(CommandType.RANDOM, data, event.get_platform_name())
         yield event.image_result(url)
 
     async def build_html(
@@ -31,8 +26,7 @@ class Random(BaseCommand):
         cmd_type: CommandType = CommandType.RANDOM,
         resp: TouchGalResponse = None,
     ):
-        text = await self.touchgal.request_html(unique_id)
-        details = await HTMLHandler.handle_touchgal_details(text)
+        details = await self.touchgal.request_details(unique_id)
 
         if resp is None:
             res, _ = await self.touchgal.request_vn_by_search(
@@ -47,9 +41,15 @@ class Random(BaseCommand):
         third = html_details.third_info or ""
         third_id = f"{third[0]}：{third[1]}" if third else ""
         desc = html_details.description.replace("、", "<br>")
-        previews = await self.build_images(html_details.previews, "touchgal")
+        previews = await self.build_images(
+            html_details.previews, "touchgal", width=image_sizes["preview"]
+        )
         main_image = (
-            (await self.build_images([res.banner], "touchgal"))[0]
+            (
+                await self.build_images(
+                    [res.banner], "touchgal", width=image_sizes["main"]
+                )
+            )[0]
             if res.banner
             else self.err_image
         )
@@ -1,6 +1,6 @@
 import asyncio
 
-from astrbot.api import AstrBotConfig, html_renderer
+from astrbot.api import AstrBotConfig
 from astrbot.api.event import AstrMessageEvent
 from astrbot.core.utils.session_waiter import (
     SessionController,
@@ -9,7 +9,12 @@ from astrbot.core.utils.session_waiter import (
 
 from ..services import Services
 from ..type.exceptions import EarlyReturn, SessionTimeoutException
-from ..type.inner_models import CommandType, RecommendCache, template_list
+from ..type.inner_models import (
+    CommandType,
+    Priority,
+    RecommendCache,
+    current_priority,
+)
 from ..type.outer_models import TouchGalResponse
 from ..utils import OnlySenderFilter
 from .base_command import BaseCommand
@@ -53,7 +58,9 @@ class Recommend(BaseCommand):
         )
         self.session_cache_dict[session_id] = task
 
-        asyncio.create_task(self._make_machine(session_id, value))
+        asyncio.create_task(
+            self._make_machine(session_id, value, event.get_platform_name())
+        )
 
         await asyncio.wait(
             [
@@ -124,7 +131,7 @@ class Recommend(BaseCommand):
         finally:
             task.stop_signal.set()
 
-    async def _make_machine(self, session_id: str, value: str):
+    async def _make_machine(self, session_id: str, value: str, platform: str = ""):
         task = self.session_cache_dict[session_id]
 
         while not task.stop_signal.is_set():
@@ -160,8 +167,12 @@ class Recommend(BaseCommand):
 
             current = task.tasks_remaining_queue.pop(0)
             task.handling += 1
+            # 没有备好的结果时用户正在等待，否则只是预取
+            current_priority.set(
+                Priority.BACKGROUND if task.ready_queue else Priority.INTERACTIVE
+            )
             try:
-                url = await self._core_handler(current)
+                url = await self._core_handler(current, platform)
                 task.ready_queue.append(url)
 
                 task.ready_signal.set()
@@ -172,12 +183,8 @@ class Recommend(BaseCommand):
         else:
             self.session_cache_dict.pop(session_id, None)
 
-    async def _core_handler(self, res: TouchGalResponse):
+    async def _core_handler(self, res: TouchGalResponse, platform: str = ""):
         data = await self.random.build_html(
             res.uniqueId, cmd_type=CommandType.RECOMMEND, resp=res
         )
-        tmpl = self.templates[template_list[CommandType.RANDOM.value]]
-
-        return await html_renderer.render_custom_template(
-            tmpl, data, True, self.render_options
-        )
+        return await self.render(CommandType.RANDOM, data, platform)
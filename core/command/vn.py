@@ -1,7 +1,7 @@
-from astrbot.api import AstrBotConfig, html_renderer
+from astrbot.api import AstrBotConfig
 from astrbot.api.event import AstrMessageEvent
 
-from ..type.inner_models import CommandType, template_list
+from ..type.inner_models import CommandType, image_sizes
 from ..type.outer_models import VNDBVnResponse
 from .base_command import BaseCommand
 
@@ -16,20 +16,19 @@ class Vn(BaseCommand):
     async def goooooooooo(self, event: AstrMessageEvent, value: str):
         res = await self.vndb.request_by_vn(value)
         data = await self.build(res)
-        tmpl = self.templates[template_list[CommandType.VN.value]]
-
-        url = await html_renderer.render_custom_template(
-            tmpl, data, True, self.render_options
-        )
+        url = await self.render(CommandType.VN, data, event.get_platform_name())
         yield event.image_result(url)
 
     async def build(self, res: list[VNDBVnResponse], **kwargs):
+        desc = kwargs.get("desc", "")
+        previews = kwargs.get("previews", [])
+        images = await self.build_vndb_images(
+            res, width=image_sizes["main" if desc else "card"]
+        )
         cards = [
             {"image": img, "desc": self.build_vn(info)}
-            for img, info in zip(await self.build_vndb_images(res), res)
+            for img, info in zip(images, res)
         ]
-        desc = kwargs.get("desc", "")
-        previews = kwargs.get("previews", [])
         if desc:
             vndb = res[0]
             card = cards[0]
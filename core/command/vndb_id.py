@@ -1,15 +1,14 @@
-from astrbot.api import AstrBotConfig, html_renderer
+from astrbot.api import AstrBotConfig
 from astrbot.api.event import AstrMessageEvent
 
 from ..services import Services
 from ..type.exceptions import ArgsOrNullException, NoResultException
-from ..type.inner_models import CommandType, id2command, template_list
+from ..type.inner_models import CommandType, id2command
 from ..type.outer_models import (
     VNDBCharacterResponse,
     VNDBProducerResponse,
     VNDBVnResponse,
 )
-from ..utils import HTMLHandler
 from . import Character, Producer, Vn
 from .base_command import BaseCommand
 
@@ -37,20 +36,17 @@ class VndbId(BaseCommand):
                 search_info, _ = await self.touchgal.request_vn_by_search(
                     CommandType.ID, value
                 )
-                html_text = await self.touchgal.request_html(search_info[0].uniqueId)
-                detail = await HTMLHandler.handle_touchgal_details(html_text)
+                detail = await self.touchgal.request_details(search_info[0].uniqueId)
                 desc = detail.description
                 previews = detail.previews
             except NoResultException:
                 pass
 
         data = await self.build(real_type, res, desc, previews)
-        tmpl = self.templates[
-            template_list[real_type.value if not desc else CommandType.RANDOM.value]
-        ]
-
-        url = await html_renderer.render_custom_template(
-            tmpl, data, True, self.render_options
+        url = await self.render(
+            real_type if not desc else CommandType.RANDOM,
+            data,
+            event.get_platform_name(),
         )
         yield event.image_result(url)
 
@@ -1,3 +1,4 @@
+from .assets import AssetServer
 from .cache import Cache
 
-__all__ = ["Cache"]
+__all__ = ["AssetServer", "Cache"]
@@ -0,0 +1,77 @@
+import hashlib
+
+from aiohttp import web
+
+from astrbot.api import AstrBotConfig, logger
+
+from ..type.inner_models import mime_type
+from ..utils import LRUCache
+
+
+class AssetServer:
+    """把背景、字体等静态资源通过本地HTTP服务提供给渲染器，渲染数据中只传链接"""
+
+    cache_control = "public, max-age=31536000, immutable"
+
+    def __init__(self):
+        # 文件名中带内容哈希，同名即同内容，可以长期缓存
+        self._pinned: dict[str, tuple[bytes, str]] = {}
+        self._assets = LRUCache(64 * 1024 * 1024)
+        self._runner: web.AppRunner | None = None
+
+    @classmethod
+    async def initialize(cls, config: AstrBotConfig):
+        render_setting = config.get("renderSetting", {})
+        cls.enabled = render_setting.get("assetMode", "a")[0] == "b"
+        cls.host = render_setting.get("assetHost", "127.0.0.1")
+        # 默认只监听本机，渲染服务在其他机器时需要改为对应网卡或0.0.0.0
+        cls.bind = render_setting.get("assetBind", "127.0.0.1")
+        cls.port = render_setting.get("assetPort", 6190)
+
+        instance = cls()
+        if cls.enabled:
+            await instance._start()
+        return instance
+
+    async def terminate(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def register(
+        self, stem: str, data: bytes, suffix: str, pinned: bool = False
+    ) -> str:
+        digest = hashlib.blake2b(data, digest_size=8).hexdigest()
+        name = f"{stem}.{digest}.{suffix}"
+        if pinned:
+            self._pinned[name] = (data, mime_type[suffix])
+        elif name not in self._assets:
+            self._assets.set(name, (data, mime_type[suffix]), size=len(data))
+        return f"http://{self.host}:{self.port}/assets/{name}"
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_get("/assets/{name}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, self.bind, self.port).start()
+        except OSError as e:
+            await self.terminate()
+            self.enabled = False
+            logger.error(f"静态资源服务启动失败，改为内嵌资源：{e}")
+            return
+        logger.info(f"静态资源服务已启动：http://{self.host}:{self.port}/assets/")
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        name = request.match_info["name"]
+        item = self._pinned.get(name) or self._assets.get(name)
+        if item is None:
+            raise web.HTTPNotFound()
+
+        data, mime = item
+        return web.Response(
+            body=data,
+            content_type=mime,
+            headers={"Cache-Control": self.cache_control},
+        )
@@ -1,47 +1,134 @@
 import asyncio
+import hashlib
 import os
 import shutil
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
 from pathlib import Path
 from typing import Literal
 
-from astrbot.api import AstrBotConfig
+from pydantic import ValidationError
+
+from astrbot.api import AstrBotConfig, logger
 from astrbot.api.star import StarTools
 
-from ..type.inner_models import bs64
-from ..utils import File, Image
+from ..network import Downloader
+from ..type.inner_models import CacheMeta, Fetched, bs64
+from ..utils import File, Image, LRUCache, SingleFlight
 
 
 class Cache:
+    """
+    图片缓存分为两层文件：
+    {group}_{URL哈希}.json 记录来源与对应的图片文件
+    {内容哈希}.jpg 为图片本体，相同内容的图片只存一份
+    """
+
     cache_path = StarTools.get_data_dir("astrbot_plugin_galgame_box") / "cache"
     err_path = Path(__file__).parent / ".." / ".." / "resources" / "image" / "error.jpg"
 
+    groups = ("vndb", "touchgal")
+    # 淘汰到预算的该比例以下，避免每次写入都触发淘汰
+    evict_watermark = 0.9
+
     def __init__(self):
         os.makedirs(self.cache_path, exist_ok=True)
+        # 图片文件名 -> 占用字节数，按访问先后排序，最久未访问的在前
+        self._index: OrderedDict[str, int] = OrderedDict()
+        self._touched: dict[str, float] = {}
+        self._total_size = 0
+        self._evict_task: asyncio.Task | None = None
+        # URL键 -> 图片文件名，以及反向引用，淘汰图片时一并删除引用
+        self._keys: dict[str, str] = {}
+        self._refs: dict[str, set[str]] = {}
+        # URL键 -> 上次确认来源未变化的时间
+        self._checked: dict[str, float] = {}
+        # 热点图片常驻内存，直接保存渲染用的data URI
+        self.memory = LRUCache(self.memory_size)
+        # 同一图片的并发请求只下载、转换、写入一次
+        self._flights = SingleFlight()
 
     @classmethod
     async def initialize(cls, config: AstrBotConfig):
+        from ..services import Services
+
+        cls.downloader = Services.get(Downloader)
         cls.err_image = await File.read_buffer2base64(cls.err_path)
         cls.clean_on_restart = config.get("basicSetting", {}).get(
             "cleanOnRestart", False
         )
+        cache_setting = config.get("cacheSetting", {})
+        cls.max_size = cache_setting.get("cacheMaxSize", 512) * 1024 * 1024
+        cls.max_entries = cache_setting.get("cacheMaxEntries", 20000)
+        cls.memory_size = cache_setting.get("memoryCacheSize", 64) * 1024 * 1024
+        # 超过该时间的图片使用前先用条件请求确认来源是否变化，0为不确认
+        cls.revalidate_ttl = cache_setting.get("imageRevalidateTtl", 604800)
 
-        return cls()
+        instance = cls()
+        await instance._migrate_legacy()
+        await instance._build_index()
+        await instance._load_keys()
+        return instance
 
     async def terminate(self):
+        stats = self.memory.stats()
+        logger.debug(
+            f"内存图片缓存命中{stats['hits']}次，未命中{stats['misses']}次，"
+            f"当前{stats['entries']}项共{stats['size']}字节。"
+        )
+        if self._evict_task and not self._evict_task.done():
+            await self._evict_task
         if self.clean_on_restart:
             await self.clean_cache()
+        else:
+            await asyncio.to_thread(self._flush_access, self._pop_touched())
+
+    async def load(
+        self,
+        group: Literal["vndb", "touchgal"],
+        url: str,
+        loader: Callable[[str, str, str], Awaitable[Fetched | None]],
+        prefix: bool = True,
+        width: int | None = None,
+    ) -> bs64 | None:
+        # 缩小后的图片以带尺寸的来源单独缓存
+        source = f"{url}#w={width}" if width else url
+        key = self._key(group, source)
+        if self._stale(key):
+            data_uri = await self._flights.do(
+                ("revalidate", key),
+                lambda: self._revalidate(group, url, loader, width),
+            )
+            if data_uri is not None:
+                return self._with_prefix(data_uri, prefix)
+
+        cache_data = await self.read_cache(group, source, prefix=prefix)
+        if cache_data is not None:
+            return cache_data
+
+        data_uri = await self._flights.do(
+            self._key(group, source),
+            lambda: self._fetch(group, url, loader, width),
+        )
+        return None if data_uri is None else self._with_prefix(data_uri, prefix)
 
     async def read_cache(
         self, group: Literal["vndb", "touchgal"], url: str, prefix: bool = True
     ) -> bs64 | None:
-        filename, source_suffix = self._convert(group, url)
-        file_path = self.cache_path / filename
+        key = self._key(group, url)
+        blob = self._keys.get(key)
+        if blob is None and "#w=" not in url:
+            # 旧版只缓存原图，带尺寸的来源不能认领旧文件，需由原图缩小
+            blob = await self._adopt_legacy(group, url, key)
+        if blob is None:
+            return None
 
-        if file_path.exists():
-            base64_prefix = await File.read_text(file_path)
-            return base64_prefix if prefix else File.erase_base64_prefix(base64_prefix)
-        else:
+        data_uri = await self._read_blob(blob)
+        if data_uri is None:
+            self._forget(key)
             return None
+        return self._with_prefix(data_uri, prefix)
 
     async def write_cache(
         self,
@@ -50,36 +137,408 @@ class Cache:
         buffer: bytes,
         prefix: bool = True,
     ) -> bs64 | None:
-        filename, source_suffix = self._convert(group, url)
-        file_path = self.cache_path / filename
+        blob, buffer = await self._store(group, url, buffer)
+        data_uri = self.memory.get(blob)
+        if data_uri is None:
+            data_uri = self._remember(blob, await File.buffer2base64(buffer))
+        return self._with_prefix(data_uri, prefix)
+
+    async def _store(
+        self,
+        group: Literal["vndb", "touchgal"],
+        url: str,
+        buffer: bytes,
+        fetched: Fetched | None = None,
+    ) -> tuple[str, bytes]:
+        """写入图片并返回图片文件名与JPEG数据"""
+        blob = hashlib.blake2b(buffer, digest_size=16).hexdigest()
+
+        # 相同内容已存在时既不重复转换也不重复写入
+        stored = await self._read_blob_buffer(blob)
+        if stored is None:
+            if not Image.is_jpeg(buffer):
+                buffer = await Image.image2jpg_async(buffer)
+            await File.write_buffer(self._blob_path(blob), buffer)
+            self._add_blob(blob, len(buffer))
+        else:
+            buffer = stored
+
+        key = self._key(group, url)
+        meta = CacheMeta(source=url, blob=blob, size=len(buffer), checked=time.time())
+        if fetched is not None:
+            meta.etag = fetched.etag
+            meta.last_modified = fetched.last_modified
+        await File.write_text(
+            self._meta_path(key), meta.model_dump_json(), overwrite=True
+        )
+        self._link(key, blob)
+        self._checked[key] = meta.checked
+        return blob, buffer
+
+    def _stale(self, key: str) -> bool:
+        return (
+            self.revalidate_ttl > 0
+            and key in self._keys
+            and time.time() - self._checked.get(key, 0) >= self.revalidate_ttl
+        )
+
+    async def _revalidate(
+        self,
+        group: Literal["vndb", "touchgal"],
+        url: str,
+        loader: Callable[[str, str, str], Awaitable[Fetched | None]],
+        width: int | None,
+    ) -> bs64 | None:
+        """用条件请求确认原图是否变化，未变化或请求失败时返回None继续使用缓存"""
+        source = f"{url}#w={width}" if width else url
+        key, original_key = self._key(group, source), self._key(group, url)
+        original = await self._read_meta(original_key)
+        fetched = await loader(
+            url,
+            original.etag if original else "",
+            original.last_modified if original else "",
+        )
+
+        if fetched is not None and not fetched.not_modified and fetched.body:
+            try:
+                blob, buffer = await self._store(group, url, fetched.body, fetched)
+                if original is None or blob != original.blob:
+                    if width:
+                        buffer = await Image.resize_async(buffer, width)
+                        return await self.write_cache(group, source, buffer)
+                    return self._remember(blob, await File.buffer2base64(buffer))
+            except Exception as e:
+                # 新内容无法使用时保留旧缓存
+                self._undecodable(url, e)
+
+        # 内容未变化，或者请求失败时等下个周期再确认
+        now = time.time()
+        for meta_key in {key, original_key}:
+            await self._mark_checked(meta_key, now)
+        return None
+
+    async def _mark_checked(self, key: str, checked: float):
+        meta = await self._read_meta(key)
+        if meta is None:
+            return
+        meta.checked = checked
+        await File.write_text(
+            self._meta_path(key), meta.model_dump_json(), overwrite=True
+        )
+        self._checked[key] = checked
+
+    async def _read_meta(self, key: str) -> CacheMeta | None:
+        try:
+            return CacheMeta.model_validate_json(
+                await File.read_text(self._meta_path(key))
+            )
+        except (OSError, ValidationError):
+            return None
+
+    async def _fetch(
+        self,
+        group: Literal["vndb", "touchgal"],
+        url: str,
+        loader: Callable[[str, str, str], Awaitable[Fetched | None]],
+        width: int | None,
+    ) -> bs64 | None:
+        source = f"{url}#w={width}" if width else url
+        # 可能在排队期间已被其它请求写入
+        cache_data = await self.read_cache(group, source)
+        if cache_data is not None:
+            return cache_data
 
-        if source_suffix not in ("jpg", "jpeg"):
-            buffer = await Image.image2jpg_async(buffer)
-        bs64_image = await File.buffer2base64(buffer)
-        await File.write_text(file_path, bs64_image)
-        return bs64_image if prefix else File.erase_base64_prefix(bs64_image)
+        # 原图同样缓存，不同尺寸共用一次下载
+        buffer = await self._flights.do(
+            ("original", self._key(group, url)),
+            lambda: self._original(group, url, loader),
+        )
+        if buffer is None:
+            return None
+        if width:
+            try:
+                buffer = await Image.resize_async(buffer, width)
+            except Exception as e:
+                # 已缓存的原图损坏，忘记后等失败记录过期再重新下载
+                self._forget(self._key(group, url))
+                self._undecodable(url, e)
+                return None
+        return await self.write_cache(group, source, buffer)
+
+    async def _original(
+        self,
+        group: Literal["vndb", "touchgal"],
+        url: str,
+        loader: Callable[[str, str, str], Awaitable[Fetched | None]],
+    ) -> bytes | None:
+        key = self._key(group, url)
+        blob = self._keys.get(key) or await self._adopt_legacy(group, url, key)
+        if blob is not None:
+            buffer = await self._read_blob_buffer(blob)
+            if buffer is not None:
+                return buffer
+
+        fetched = await loader(url, "", "")
+        if fetched is None or not fetched.body:
+            return None
+        try:
+            _, buffer = await self._store(group, url, fetched.body, fetched)
+        except Exception as e:
+            self._undecodable(url, e)
+            return None
+        return buffer
+
+    def _undecodable(self, url: str, e: Exception):
+        """错误页面、不完整的文件等无法解码的内容按下载失败处理，调用方改用失败占位图"""
+        logger.warning(f"图片无法解码，已忽略：{url}，{e!r}")
+        self.downloader.mark_failed(url, f"无法解码：{e!r}")
 
     async def clean_cache(self):
         if os.path.exists(self.cache_path):
             await asyncio.to_thread(shutil.rmtree, self.cache_path)
+        self._index.clear()
+        self._touched.clear()
+        self._keys.clear()
+        self._refs.clear()
+        self._checked.clear()
+        self._total_size = 0
+        self.memory.clear()
         await self._create_dir()
 
-    def _convert(
-        self, group: Literal["vndb", "touchgal"], link: str
-    ) -> tuple[Path, str]:
-        left, _ = link.rsplit(".", maxsplit=1)
-        if group == "vndb":
-            return (
-                self.cache_path / f"{group}_{left.rsplit('/', maxsplit=1)[1]}",
-                left.lower(),
-            )
-        else:
-            split_count = 3 if "banner" in link else 1
-            return (
-                self.cache_path
-                / f"{group}_{left.rsplit('/', maxsplit=split_count)[1]}",
-                left.lower(),
-            )
+    async def _read_blob_buffer(self, blob: str) -> bytes | None:
+        if blob not in self._index:
+            return None
+        try:
+            buffer = await File.read_buffer(self._blob_path(blob))
+        except FileNotFoundError:
+            # 读取时恰好被淘汰
+            self._discard(blob)
+            return None
+
+        self._touch(blob)
+        return buffer
+
+    async def _read_blob(self, blob: str) -> bs64 | None:
+        if blob not in self._index:
+            return None
+
+        data_uri = self.memory.get(blob)
+        if data_uri is not None:
+            self._touch(blob)
+            return data_uri
+
+        buffer = await self._read_blob_buffer(blob)
+        if buffer is None:
+            return None
+        return self._remember(blob, await File.buffer2base64(buffer))
+
+    def _touch(self, blob: str):
+        self._index.move_to_end(blob)
+        self._touched[blob] = time.time()
+
+    def _remember(self, blob: str, data_uri: bs64) -> bs64:
+        self.memory.set(blob, data_uri, size=len(data_uri))
+        return data_uri
+
+    @staticmethod
+    def _with_prefix(data_uri: bs64, prefix: bool) -> bs64:
+        return data_uri if prefix else data_uri.split(",", 1)[1]
+
+    def _add_blob(self, blob: str, size: int):
+        self._discard(blob)
+        self._index[blob] = size
+        self._total_size += size
+        if self._over_budget(1.0):
+            self._schedule_evict()
+
+    def _link(self, key: str, blob: str):
+        self._forget(key)
+        self._keys[key] = blob
+        self._refs.setdefault(blob, set()).add(key)
+
+    def _forget(self, key: str):
+        self._checked.pop(key, None)
+        blob = self._keys.pop(key, None)
+        if blob is not None and blob in self._refs:
+            self._refs[blob].discard(key)
+
+    async def _build_index(self):
+        def scan() -> list[tuple[float, str, int]]:
+            entries = []
+            with os.scandir(self.cache_path) as it:
+                for entry in it:
+                    if not entry.name.endswith(".jpg"):
+                        continue
+                    stat = entry.stat()
+                    entries.append(
+                        (
+                            max(stat.st_atime, stat.st_mtime),
+                            entry.name[:-4],
+                            stat.st_size,
+                        )
+                    )
+            return sorted(entries)
+
+        self._index.clear()
+        self._total_size = 0
+        for _, name, size in await asyncio.to_thread(scan):
+            self._index[name] = size
+            self._total_size += size
+        if self._over_budget(1.0):
+            self._schedule_evict()
+
+    async def _load_keys(self):
+        """读取所有URL键，图片文件已不存在的元数据一并删除"""
+
+        def scan() -> tuple[dict[str, CacheMeta], list[str]]:
+            metas, broken = {}, []
+            with os.scandir(self.cache_path) as it:
+                for entry in it:
+                    if not entry.name.endswith(".json"):
+                        continue
+                    try:
+                        with open(entry.path, encoding="utf-8") as f:
+                            metas[entry.name[:-5]] = CacheMeta.model_validate_json(
+                                f.read()
+                            )
+                    except (OSError, ValidationError):
+                        broken.append(entry.name[:-5])
+            return metas, broken
+
+        metas, stale = await asyncio.to_thread(scan)
+        for key, meta in metas.items():
+            if meta.blob in self._index:
+                self._link(key, meta.blob)
+                self._checked[key] = meta.checked
+            else:
+                stale.append(key)
+
+        await asyncio.to_thread(self._remove_metas, stale)
+
+    async def _adopt_legacy(
+        self, group: Literal["vndb", "touchgal"], url: str, key: str
+    ) -> str | None:
+        """没有来源记录的旧版图片只能按旧命名规则匹配，命中后补写元数据"""
+        name = self._legacy_name(group, url)
+        if name is None or name not in self._index or self._refs.get(name):
+            return None
+
+        meta = CacheMeta(
+            source=url, blob=name, size=self._index[name], checked=time.time()
+        )
+        await File.write_text(
+            self._meta_path(key), meta.model_dump_json(), overwrite=True
+        )
+        self._link(key, name)
+        self._checked[key] = meta.checked
+        return name
+
+    def _over_budget(self, ratio: float) -> bool:
+        return (self.max_size > 0 and self._total_size > self.max_size * ratio) or (
+            self.max_entries > 0 and len(self._index) > self.max_entries * ratio
+        )
+
+    def _schedule_evict(self):
+        if self._evict_task is None or self._evict_task.done():
+            self._evict_task = asyncio.create_task(self._evict())
+
+    async def _evict(self):
+        victims, keys = [], []
+        while self._index and self._over_budget(self.evict_watermark):
+            blob, size = self._index.popitem(last=False)
+            self._total_size -= size
+            self._touched.pop(blob, None)
+            self.memory.pop(blob)
+            for key in self._refs.pop(blob, ()):
+                self._keys.pop(key, None)
+                self._checked.pop(key, None)
+                keys.append(key)
+            victims.append(blob)
+
+        await asyncio.to_thread(self._flush_access, self._pop_touched())
+        await asyncio.to_thread(self._remove_blobs, victims)
+        await asyncio.to_thread(self._remove_metas, keys)
+        if victims:
+            logger.info(f"图片缓存超出预算，已淘汰{len(victims)}个最久未使用的缓存。")
+
+    def _discard(self, blob: str):
+        size = self._index.pop(blob, None)
+        if size is not None:
+            self._total_size -= size
+        self._touched.pop(blob, None)
+
+    def _pop_touched(self) -> dict[str, float]:
+        touched, self._touched = self._touched, {}
+        return touched
+
+    def _flush_access(self, touched: dict[str, float]):
+        """把内存中的访问时间写回文件，保证重启后淘汰顺序不变"""
+        for blob, atime in touched.items():
+            try:
+                os.utime(self._blob_path(blob), (atime, atime))
+            except OSError:
+                pass
+
+    def _remove_blobs(self, blobs: list[str]):
+        for blob in blobs:
+            try:
+                os.remove(self._blob_path(blob))
+            except OSError:
+                pass
+
+    def _remove_metas(self, keys: list[str]):
+        for key in keys:
+            try:
+                os.remove(self._meta_path(key))
+            except OSError:
+                pass
+
+    async def _migrate_legacy(self):
+        """旧版缓存为无后缀的base64文本，一次性转换为原始图片"""
+        if not os.path.exists(self.cache_path):
+            return
+
+        legacy = [
+            entry
+            for entry in await asyncio.to_thread(os.listdir, self.cache_path)
+            if entry.split("_", 1)[0] in self.groups and "." not in entry
+        ]
+        if not legacy:
+            return
+
+        migrated = 0
+        for entry in legacy:
+            legacy_path = self.cache_path / entry
+            try:
+                text = await File.read_text(legacy_path)
+                buffer = await asyncio.to_thread(File.base64_to_buffer, text)
+                await File.write_buffer(self._blob_path(entry), buffer)
+                migrated += 1
+            except Exception as e:
+                logger.warning(f"旧缓存迁移失败：{entry}，{e}")
+            finally:
+                os.remove(legacy_path)
+        logger.info(f"已迁移{migrated}个旧版图片缓存。")
+
+    @staticmethod
+    def _key(group: Literal["vndb", "touchgal"], url: str) -> str:
+        return f"{group}_{hashlib.sha1(url.encode()).hexdigest()}"
+
+    @staticmethod
+    def _legacy_name(group: Literal["vndb", "touchgal"], link: str) -> str | None:
+        """旧版按URL路径截取的文件名，仅用于匹配迁移前的缓存"""
+        try:
+            left, _ = link.rsplit(".", maxsplit=1)
+            split_count = 3 if group == "touchgal" and "banner" in link else 1
+            return f"{group}_{left.rsplit('/', maxsplit=split_count)[1]}"
+        except (ValueError, IndexError):
+            return None
+
+    def _blob_path(self, blob: str) -> Path:
+        return self.cache_path / f"{blob}.jpg"
+
+    def _meta_path(self, key: str) -> Path:
+        return self.cache_path / f"{key}.json"
 
     def _check_cache(self, path: str) -> bool:
         return os.path.exists(path)
@@ -1,7 +1,8 @@
 from .animetrace import AnimeTrece
+from .client import Client
 from .downloader import Downloader
 from .http import Http
 from .touchgal import TouchGal
 from .vndb import Vndb
 
-__all__ = ["Http", "Downloader", "Vndb", "TouchGal", "AnimeTrece"]
+__all__ = ["Client", "Http", "Downloader", "Vndb", "TouchGal", "AnimeTrece"]
@@ -0,0 +1,92 @@
+import asyncio
+import ssl
+from urllib.parse import urlparse
+
+from aiohttp import ClientResponse, ClientSession, ClientTimeout, TCPConnector
+
+from astrbot.api import AstrBotConfig, logger
+
+from ..utils import ImageStream
+
+
+class Client:
+    """Http与Downloader共用的连接池，同一主机的连接保持复用"""
+
+    def __init__(self):
+        self._session: ClientSession | None = None
+
+    @classmethod
+    async def initialize(cls, config: AstrBotConfig):
+        network = config.get("networkSetting", {})
+        cls.limit = network.get("connectionLimit", 100)
+        cls.limit_per_host = network.get("connectionLimitPerHost", 8)
+        cls.dns_ttl = network.get("dnsCacheTtl", 300)
+        cls.keepalive = network.get("keepaliveTimeout", 30)
+        cls.request_time = config.get("basicSetting", {}).get("requestTime", 30)
+        # 所有连接共用同一个TLS上下文，证书只加载一次
+        cls.ssl_context = ssl.create_default_context()
+        # 图片下载的大小与像素上限，0为不限制
+        cls.max_image_bytes = network.get("maxImageSize", 20) * 1024 * 1024
+        cls.max_image_pixels = network.get("maxImagePixels", 50_000_000)
+
+        # 主机 -> 代理地址，子域名按上级域名匹配，"*"匹配所有主机
+        cls.proxies: dict[str, str] = {}
+        for entry in network.get("proxyMap", []):
+            host, _, proxy = entry.partition("=")
+            if not host.strip() or not proxy.strip():
+                logger.warning(f"忽略无效的代理配置：{entry}")
+                continue
+            cls.proxies[host.strip().lower()] = proxy.strip()
+
+        instance = cls()
+        # 连接器必须在事件循环内创建，插件重载后随新的实例重新创建
+        instance._create()
+        return instance
+
+    @property
+    def session(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            self._create()
+        return self._session
+
+    def register_proxy(self, host: str, proxy: str):
+        """代理表中未单独配置该主机时使用此代理"""
+        self.proxies.setdefault(host.lower(), proxy)
+
+    def proxy_for(self, url: str) -> str | None:
+        if not self.proxies:
+            return None
+        host = (urlparse(url).hostname or "").lower()
+        while host:
+            if host in self.proxies:
+                return self.proxies[host]
+            host = host.partition(".")[2]
+        return self.proxies.get("*")
+
+    async def read_image(self, response: ClientResponse) -> bytes:
+        """分块读取图片响应，超过大小或像素上限时提前中止"""
+        stream = ImageStream(self.max_image_bytes, self.max_image_pixels)
+        stream.check_length(response.content_length)
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            stream.feed(chunk)
+        return stream.getvalue()
+
+    def _create(self):
+        connector = TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_ttl,
+            keepalive_timeout=self.keepalive,
+            ssl=self.ssl_context,
+        )
+        self._session = ClientSession(
+            connector=connector,
+            timeout=ClientTimeout(total=self.request_time),
+        )
+
+    async def terminate(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            # 等待TLS连接完成关闭，避免重载后出现未关闭连接的警告
+            await asyncio.sleep(0.25)
+        self._session = None
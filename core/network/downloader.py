@@ -1,45 +1,90 @@
 import asyncio
 
-from aiohttp import ClientSession, ClientTimeout, TCPConnector
+from aiohttp import ClientResponseError
 
-from astrbot.api import AstrBotConfig
+from astrbot.api import AstrBotConfig, logger
+
+from ..services import Services
+from ..type.exceptions import ImageTooLargeException
+from ..type.inner_models import Fetched
+from ..utils import LRUCache
+from .client import Client
 
 
 class Downloader:
     headers = {"Content-Type": "application/json"}
-    connector = TCPConnector(
-        limit_per_host=5, limit=20, ttl_dns_cache=300, keepalive_timeout=10
-    )
+    # 资源已不存在，重试没有意义
+    permanent_status = (404, 410)
 
     @classmethod
     async def initialize(cls, config: AstrBotConfig):
         cls.timeout_times = config.get("basicSetting", {}).get("requestTimeout", 3)
-
-        request_time = config.get("basicSetting", {}).get("requestTime", 30)
-        cls.session = ClientSession(
-            timeout=ClientTimeout(total=request_time),
-            headers=cls.headers,
-            connector=cls.connector,
+        cls.client = Services.get(Client)
+        # 近期下载失败的URL -> 失败原因，过期前不再尝试下载
+        cls.failures = LRUCache(
+            4096, ttl=config.get("cacheSetting", {}).get("failureTtl", 600)
         )
         return cls()
 
-    async def terminate(self):
-        if not self.session.closed:
-            await self.session.close()
-
     async def download_image(self, url: str, **kwargs) -> bytes | None:
-        return await self._get(url, **kwargs)
+        fetched = await self._get(url, **kwargs)
+        return None if fetched is None else fetched.body
+
+    async def fetch(
+        self, url: str, etag: str = "", last_modified: str = ""
+    ) -> Fetched | None:
+        """带校验信息的下载，图片未变化时返回not_modified"""
+        return await self._get(
+            url,
+            headers={
+                **self.headers,
+                **Fetched.conditional_headers(etag, last_modified),
+            },
+        )
 
-    async def _get(self, url: str, **kwargs) -> bytes | None:
+    def failure_reason(self, url: str) -> str | None:
+        return self.failures.get(url)
+
+    def mark_failed(self, url: str, reason: str):
+        """记录下载失败的URL，包括下载成功但内容无法使用的图片"""
+        if self.failures.ttl > 0:
+            self.failures.set(url, reason)
+        logger.debug(f"图片下载失败：{url}，{reason}")
+
+    async def _get(self, url: str, **kwargs) -> Fetched | None:
         if not url.startswith("http"):
             return None
+        if url in self.failures:
+            return None
+
+        headers = kwargs.pop("headers", self.headers)
         count = 0
+        reason = ""
         while count < self.timeout_times:
             try:
-                async with self.session.get(url, **kwargs) as response:
-                    return await response.read()
+                async with self.client.session.get(
+                    url, headers=headers, proxy=self.client.proxy_for(url), **kwargs
+                ) as response:
+                    response.raise_for_status()
+                    return Fetched.from_response(
+                        response.status,
+                        response.headers,
+                        None
+                        if response.status == 304
+                        else await self.client.read_image(response),
+                    )
+
+            except ClientResponseError as e:
+                reason = f"HTTP {e.status}"
+                if e.status in self.permanent_status:
+                    break
+            except ImageTooLargeException as e:
+                reason = str(e)
+                break
+            except Exception as e:
+                reason = repr(e)
+            await asyncio.sleep(0.5 * (2**count))
+            count += 1
 
-            except Exception:
-                await asyncio.sleep(0.5 * (2**count))
-                count += 1
+        self.mark_failed(url, reason)
         return None
@@ -1,108 +1,331 @@
 import asyncio
+import json
+import random
+import time
 from typing import Literal
+from urllib.parse import urlparse
 
-from aiohttp import ClientSession, ClientTimeout
+from aiohttp import (
+    ClientConnectionError,
+    ClientPayloadError,
+    ClientResponseError,
+    ContentTypeError,
+)
 
 from astrbot.api import AstrBotConfig, logger
+from astrbot.api.star import StarTools
 
-from ..type.exceptions import InternetException
+from ..services import Services
+from ..type.exceptions import (
+    CircuitOpenException,
+    InternetException,
+    RateLimitException,
+)
+from ..type.inner_models import Fetched
+from ..utils import CircuitBreaker, File, ImageStream, LRUCache
+from .client import Client
 
 
 class Http:
     headers = {"Content-Type": "application/json"}
+    # 网络层面的错误才值得重试，4xx等错误重试也不会成功
+    retryable_errors = (asyncio.TimeoutError, ClientConnectionError, ClientPayloadError)
+    cookies_path = (
+        StarTools.get_data_dir("astrbot_plugin_galgame_box") / "curl_cookies.json"
+    )
+    _curl_session = None
 
     @classmethod
     async def initialize(cls, config: AstrBotConfig):
         cls.timeout_times = config.get("basicSetting", {}).get("requestTimeout", 3)
         cls.tls = config.get("safetySetting", {}).get("tls", "chrome136")
+        cls.client = Services.get(Client)
+        cls.curl_clients = config.get("networkSetting", {}).get("curlPoolSize", 10)
+        cls._saved_cookies = await cls._load_cookies()
 
-        cls.session = ClientSession(
-            timeout=ClientTimeout(
-                total=config.get("basicSetting", {}).get("requestTime", 30)
-            )
+        network = config.get("networkSetting", {})
+        cls.retry_base_delay = network.get("retryBaseDelay", 0.5)
+        cls.retry_max_delay = network.get("retryMaxDelay", 8)
+        # 按主机熔断，网站不可用时直接失败，不再占用重试时间
+        cls.breaker = CircuitBreaker(
+            network.get("breakerThreshold", 5), network.get("breakerRecovery", 30)
         )
+        # 主机 -> [上次试探时间]，记住只有curl_cffi能成功的网站，过期后重新按默认顺序尝试
+        memory_ttl = network.get("transportMemoryTtl", 1800)
+        cls.curl_hosts = LRUCache(256 if memory_ttl > 0 else 0, ttl=memory_ttl)
+        cls.transport_probe = network.get("transportProbeInterval", 300)
         return cls()
 
-    async def terminate(self):
-        if not self.session.closed:
-            await self.session.close()
+    @property
+    def session(self):
+        return self.client.session
+
+    def breaker_states(self) -> dict[str, dict]:
+        return self.breaker.states()
 
     async def get(
         self,
         url: str,
-        res_type: Literal["json", "bytes", "text"] = "text",
+        res_type: Literal["json", "bytes", "text", "fetched"] = "text",
         err_handle=None,
         handle_cf=False,
         **kwargs,
-    ) -> str | dict | bytes:
+    ) -> str | dict | bytes | Fetched:
         if res_type == "bytes" and not url.startswith("http"):
             if err_handle:
                 return err_handle
             else:
                 raise InternetException(url)
-        count = 0
-        while count < self.timeout_times:
+        return await self._request(
+            "get", url, res_type, err_handle, handle_cf, **kwargs
+        )
+
+    async def fetch(
+        self,
+        url: str,
+        etag: str = "",
+        last_modified: str = "",
+        handle_cf=False,
+        **kwargs,
+    ) -> Fetched:
+        """条件请求，内容未变化时返回not_modified，不传输内容"""
+        headers = {
+            **kwargs.pop("headers", {}),
+            **Fetched.conditional_headers(etag, last_modified),
+        }
+        return await self.get(
+            url, "fetched", handle_cf=handle_cf, headers=headers, **kwargs
+        )
+
+    async def post(
+        self, url: str, data: dict, handle_cf=False, retry_throttled=True, **kwargs
+    ) -> str | dict | bytes:
+        """retry_throttled为False时被限流立即抛出，由调用方自行控制请求速率"""
+        headers = kwargs.pop("headers", self.headers)
+        return await self._request(
+            "post",
+            url,
+            "json",
+            None,
+            handle_cf,
+            retry_throttled=retry_throttled,
+            json=data,
+            headers=headers,
+            **kwargs,
+        )
+
+    async def _request(
+        self,
+        method: Literal["get", "post"],
+        url: str,
+        res_type: Literal["json", "bytes", "text", "fetched"],
+        err_handle,
+        handle_cf: bool,
+        retry_throttled: bool = True,
+        **kwargs,
+    ) -> str | dict | bytes | Fetched:
+        host = urlparse(url).netloc
+        if not self.breaker.allow(host):
+            if res_type == "bytes" and err_handle:
+                return err_handle
+            raise CircuitOpenException(host)
+
+        curl_tried = False
+        error: Exception | None = None
+        probe = self.curl_hosts.get(host) if handle_cf else None
+        if probe is not None:
+            # 该网站最近只有curl_cffi能成功，偶尔试探一次aiohttp是否已经恢复
+            if time.monotonic() - probe[0] >= self.transport_probe:
+                probe[0] = time.monotonic()
+                try:
+                    result = await self._send(
+                        method, url, res_type, 1, retry_throttled, **kwargs
+                    )
+                    self.curl_hosts.pop(host)
+                    self.breaker.success(host)
+                    return result
+                except Exception:
+                    pass
             try:
-                if res_type == "json":
-                    async with self.session.get(url, **kwargs) as response:
-                        return await response.json()
-                elif res_type == "bytes":
-                    async with self.session.get(url, **kwargs) as response:
-                        return await response.read()
-                else:
-                    async with self.session.get(url, **kwargs) as response:
-                        return await response.text()
-            except Exception:
-                count += 1
-                await asyncio.sleep(0.5)
+                result = await self._cf_curl(
+                    method=method, res_type=res_type, url=url, **kwargs
+                )
+                self.breaker.success(host)
+                return result
+            except InternetException as e:
+                # 记住的通道也失败了，回到默认顺序
+                self.curl_hosts.pop(host)
+                curl_tried = True
+                error = e
+
+        try:
+            result = await self._send(
+                method, url, res_type, retry_throttled=retry_throttled, **kwargs
+            )
+            self.breaker.success(host)
+            return result
+        except Exception as e:
+            error = e
+
         if res_type == "bytes" and err_handle:
+            self._record_failure(host, error)
             return err_handle
-        if handle_cf:
-            return await self._cf_curl(
-                method="get", res_type=res_type, url=url, **kwargs
+        if handle_cf and not curl_tried:
+            try:
+                result = await self._cf_curl(
+                    method=method, res_type=res_type, url=url, **kwargs
+                )
+            except InternetException as e:
+                self._record_failure(host, e)
+                raise
+            self.breaker.success(host)
+            if self._cloudflare_blocked(error):
+                self.curl_hosts.set(host, [time.monotonic()])
+            return result
+
+        self._record_failure(host, error)
+        if isinstance(error, ClientResponseError) and error.status == 429:
+            retry_after = (error.headers or {}).get("Retry-After", "")
+            raise RateLimitException(
+                url, float(retry_after) if retry_after.isdigit() else 0
             )
-        else:
-            raise InternetException(url)
+        raise InternetException(url)
 
-    async def post(
-        self, url: str, data: dict, handle_cf=False, **kwargs
-    ) -> str | dict | bytes:
-        headers = kwargs.pop("headers", self.headers)
-        count = 0
-        while count < self.timeout_times:
+    async def _send(
+        self,
+        method: Literal["get", "post"],
+        url: str,
+        res_type: Literal["json", "bytes", "text", "fetched"],
+        attempts: int | None = None,
+        retry_throttled: bool = True,
+        **kwargs,
+    ) -> str | dict | bytes | Fetched:
+        """只重试可恢复的错误，重试间隔指数增长并带随机抖动"""
+        attempts = attempts or self.timeout_times
+        attempt = 0
+        while True:
             try:
-                async with self.session.post(
-                    url, headers=headers, json=data, **kwargs
+                async with self.session.request(
+                    method, url, proxy=self.client.proxy_for(url), **kwargs
                 ) as response:
-                    return await response.json()
-            except Exception:
-                count += 1
-                await asyncio.sleep(0.5)
-        if handle_cf:
-            return await self._cf_curl(
-                method="post", url=url, json=data, headers=headers, **kwargs
+                    if (
+                        response.status >= 500
+                        or response.status == 429
+                        or res_type in ("bytes", "fetched")
+                    ):
+                        # 服务端错误与限流才值得重试，其他错误的响应内容交给调用方判断
+                        response.raise_for_status()
+                    if res_type == "json":
+                        return await response.json()
+                    elif res_type == "bytes":
+                        return await self.client.read_image(response)
+                    elif res_type == "fetched":
+                        return Fetched.from_response(
+                            response.status, response.headers, await response.read()
+                        )
+                    else:
+                        return await response.text()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, retry_throttled)
+                attempt += 1
+                if delay is None or attempt >= attempts:
+                    raise
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _cloudflare_blocked(e: Exception | None) -> bool:
+        """aiohttp被Cloudflare拦截时才记住改用curl_cffi，普通的4xx不算"""
+        if isinstance(e, ContentTypeError):
+            # 需要JSON时返回了网页，通常是验证页面
+            return True
+        if isinstance(e, ClientResponseError) and e.status in (403, 503):
+            headers = e.headers or {}
+            return (
+                "cf-mitigated" in headers
+                or headers.get("Server", "").lower() == "cloudflare"
             )
-        else:
-            raise InternetException(url)
+        return False
 
-    async def _cf_curl(self, **kwargs) -> str | dict | bytes:
-        try:
+    def _retry_delay(
+        self, e: Exception, attempt: int, retry_throttled: bool = True
+    ) -> float | None:
+        """返回下次重试前的等待秒数，不应重试时返回None"""
+        if isinstance(e, ClientResponseError):
+            if e.status == 429:
+                if not retry_throttled:
+                    return None
+                retry_after = (e.headers or {}).get("Retry-After", "")
+                if retry_after.isdigit():
+                    # 要求等待过久时不再重试，避免指令长时间挂起
+                    delay = float(retry_after)
+                    return delay if delay <= self.retry_max_delay else None
+            elif e.status < 500:
+                return None
+        elif not isinstance(e, self.retryable_errors):
+            return None
+        delay = min(self.retry_max_delay, self.retry_base_delay * 2**attempt)
+        return delay * random.uniform(0.5, 1)
+
+    def _record_failure(self, host: str, e: Exception):
+        # 网站返回4xx说明网站本身可用，限流也不计入熔断
+        if isinstance(e, ClientResponseError) and e.status < 500:
+            self.breaker.success(host)
+            return
+        if self.breaker.failure(host):
+            logger.warning(
+                f"{host}请求连续失败，{self.breaker.recovery}秒内不再请求：{e!r}"
+            )
+
+    async def terminate(self):
+        if self._curl_session is not None:
+            await self._save_cookies()
+            await self._curl_session.close()
+            Http._curl_session = None
+
+    def _curl(self):
+        """长期复用的curl_cffi会话，复用连接与TLS握手，Cookie在请求间保留"""
+        if self._curl_session is None:
             from curl_cffi.requests import AsyncSession
 
-            async with AsyncSession() as session:
-                t = kwargs.pop("res_type", None)
-                m = kwargs.pop("method")
-                if m == "get":
-                    response = await session.get(impersonate=self.tls, **kwargs)
-                    if t == "json":
-                        return response.json()
-                    elif t == "bytes":
-                        return response.read()
-                    else:
-                        return response.text
-                else:
-                    response = await session.post(impersonate=self.tls, **kwargs)
+            session = AsyncSession(impersonate=self.tls, max_clients=self.curl_clients)
+            for cookie in self._saved_cookies:
+                session.cookies.set(
+                    cookie["name"],
+                    cookie["value"],
+                    domain=cookie["domain"],
+                    path=cookie["path"],
+                )
+            Http._curl_session = session
+        return self._curl_session
+
+    async def _cf_curl(self, **kwargs) -> str | dict | bytes | Fetched:
+        try:
+            session = self._curl()
+            proxy = self.client.proxy_for(kwargs["url"])
+            if proxy:
+                kwargs["proxies"] = {"http": proxy, "https": proxy}
+            t = kwargs.pop("res_type", None)
+            m = kwargs.pop("method")
+            if m == "get":
+                response = await session.get(**kwargs)
+                if t == "json":
                     return response.json()
+                elif t == "bytes":
+                    # curl_cffi一次性读取响应，只能在读取后检查
+                    stream = ImageStream(
+                        self.client.max_image_bytes, self.client.max_image_pixels
+                    )
+                    stream.feed(response.content)
+                    return stream.getvalue()
+                elif t == "fetched":
+                    return Fetched.from_response(
+                        response.status_code, response.headers, response.content
+                    )
+                else:
+                    return response.text
+            else:
+                response = await session.post(**kwargs)
+                return response.json()
         except ImportError:
             logger.warn(
                 "网络请求失败。目前未安装curl_cffi模块，可能解决问题通过：pip install curl_cffi"
@@ -110,3 +333,30 @@ class Http:
             raise InternetException(kwargs["url"])
         except Exception:
             raise InternetException(kwargs["url"])
+
+    async def _save_cookies(self):
+        # 保存cf_clearance等Cookie，重载后不需要重新通过验证
+        cookies = [
+            {
+                "name": i.name,
+                "value": i.value,
+                "domain": i.domain,
+                "path": i.path,
+                "expires": i.expires,
+            }
+            for i in self._curl_session.cookies.jar
+        ]
+        await File.write_text(self.cookies_path, json.dumps(cookies), overwrite=True)
+
+    @classmethod
+    async def _load_cookies(cls) -> list[dict]:
+        if not cls.cookies_path.exists():
+            return []
+
+        now = time.time()
+        try:
+            cookies = json.loads(await File.read_text(cls.cookies_path))
+        except Exception as e:
+            logger.warning(f"读取Cookie失败，将忽略：{e}")
+            return []
+        return [i for i in cookies if not i["expires"] or i["expires"] > now]
@@ -1,10 +1,17 @@
 import json
+import time
+from urllib.parse import urlparse
 
-from astrbot.api import AstrBotConfig
+from pydantic import ValidationError
+
+from astrbot.api import AstrBotConfig, logger
+from astrbot.api.star import StarTools
 
 from ..type.exceptions import AuthorityException, NoResultException
-from ..type.inner_models import CommandType
+from ..type.inner_models import CommandType, TouchGalDetails
 from ..type.outer_models import ResourceResponse, TouchGalResponse
+from ..utils import File, HTMLHandler, LRUCache
+from .client import Client
 from .http import Http
 
 
@@ -16,7 +23,9 @@ class TouchGal:
         "referer": base_url,
         "x-requested-with": "kun-fetch",
     }
-    proxies = {}
+    details_path = (
+        StarTools.get_data_dir("astrbot_plugin_galgame_box") / "touchgal_details.json"
+    )
 
     @classmethod
     async def initialize(cls, config: AstrBotConfig):
@@ -27,10 +36,8 @@ class TouchGal:
 
         proxy = safety_setting.get("proxy", "")
         if proxy:
-            cls.proxies = {
-                "http": proxy,
-                "https": proxy,
-            }
+            # 旧版代理配置只作用于TouchGal
+            Services.get(Client).register_proxy(urlparse(cls.base_url).hostname, proxy)
 
         kunNsfwEnable = (
             "all" if config.get("safetySetting", {}).get("enableNSFW", False) else "sfw"
@@ -45,13 +52,30 @@ class TouchGal:
         if cf:
             cls.cookies["cf_clearance"] = cf
 
-        return cls()
+        cache_setting = config.get("cacheSetting", {})
+        # uniqueId -> 解析后的作品详情，省去页面请求与解析
+        # 详情不随时间淘汰，过期只触发重新校验
+        cls.details = LRUCache(cache_setting.get("touchgalDetailEntries", 1024))
+        cls.detail_ttl = cache_setting.get("touchgalDetailTtl", 604800)
+
+        search_ttl = cache_setting.get("touchgalSearchTtl", 300)
+        cls.searches = LRUCache(
+            cache_setting.get("touchgalSearchEntries", 256) if search_ttl > 0 else 0,
+            ttl=search_ttl,
+        )
+
+        instance = cls()
+        await instance._load_details()
+        return instance
+
+    async def terminate(self):
+        await self._save_details()
 
     async def request_vn_by_search(
         self, cmd: CommandType, keyword: str, **kwargs
     ) -> tuple[list[TouchGalResponse], int]:
         query_string = json.dumps(
-            [{"type": "keyword", "name": i} for i in keyword.strip().split(" ")]
+            [{"type": "keyword", "name": i} for i in keyword.split()]
         )
         payload = {
             "queryString": query_string,
@@ -70,19 +94,28 @@ class TouchGal:
             "selectedYears": ["all"],
             "selectedMonths": ["all"],
         }
+        # 结果随NSFW设置变化，需要区分
+        cache_key = (
+            self.cookies["kun-patch-setting-store|state|data|kunNsfwEnable"],
+            json.dumps(payload, sort_keys=True),
+        )
+        cached = self.searches.get(cache_key)
+        if cached is not None:
+            # 调用方会消费返回的列表，需要复制
+            return list(cached[0]), cached[1]
+
         res = await self.http.post(
             self.base_url + "api/search/",
             payload,
             cookies=self.cookies,
             headers=self.headers,
-            proxies=self.proxies,
             handle_cf=True,
         )
         if isinstance(res, dict):
             if res["galgames"] and res["total"] > 0:
-                return [
-                    TouchGalResponse.model_validate(i) for i in res["galgames"]
-                ], res["total"]
+                galgames = [TouchGalResponse.model_validate(i) for i in res["galgames"]]
+                self.searches.set(cache_key, (galgames, res["total"]))
+                return list(galgames), res["total"]
             else:
                 raise NoResultException(cmd, keyword)
         else:
@@ -93,7 +126,6 @@ class TouchGal:
             self.base_url + "api/home/random",
             "json",
             cookies=self.cookies,
-            proxies=self.proxies,
             handle_cf=True,
         )
         if isinstance(resp, dict):
@@ -101,13 +133,42 @@ class TouchGal:
         else:
             raise AuthorityException(str(resp))
 
-    async def request_html(self, unique_id: str) -> str:
-        return await self.http.get(
-            self.base_url + unique_id,
-            cookies=self.cookies,
-            proxies=self.proxies,
-            handle_cf=True,
+    async def request_details(self, unique_id: str) -> TouchGalDetails:
+        details = self.details.get(unique_id)
+        if details is not None and (
+            not self.detail_ttl or time.time() - details.checked < self.detail_ttl
+        ):
+            return details
+
+        # 过期后带上校验信息请求，页面未变化时不需要重新传输与解析
+        try:
+            fetched = await self.http.fetch(
+                self.base_url + unique_id,
+                details.etag if details else "",
+                details.last_modified if details else "",
+                cookies=self.cookies,
+                handle_cf=True,
+            )
+        except Exception as e:
+            if details is None:
+                raise
+            logger.warning(f"TouchGal详情更新失败，继续使用旧数据：{e}")
+            # 与图片缓存一致，失败也视为已校验，下个周期再重新请求
+            details.checked = time.time()
+            return details
+
+        if fetched.not_modified and details is not None:
+            details.checked = time.time()
+            return details
+
+        details = await HTMLHandler.handle_touchgal_details(
+            (fetched.body or b"").decode("utf-8", "replace")
         )
+        details.etag = fetched.etag
+        details.last_modified = fetched.last_modified
+        details.checked = time.time()
+        self.details.set(unique_id, details)
+        return details
 
     async def request_download(self, touchgal_id: int) -> list[ResourceResponse]:
         resource_url = f"{self.base_url}api/patch/resource?patchId={touchgal_id}"
@@ -115,7 +176,41 @@ class TouchGal:
             resource_url,
             "json",
             cookies=self.cookies,
-            proxies=self.proxies,
             handle_cf=True,
         )
         return [ResourceResponse.model_validate(i) for i in res]
+
+    async def _save_details(self):
+        now = time.time()
+        entries = [
+            {
+                "id": unique_id,
+                "expire": now + remaining if remaining else 0,
+                "details": details.model_dump(),
+            }
+            for unique_id, details, remaining in self.details.items()
+        ]
+        await File.write_text(
+            self.details_path, json.dumps(entries, ensure_ascii=False), overwrite=True
+        )
+
+    async def _load_details(self):
+        if not self.details_path.exists():
+            return
+
+        now = time.time()
+        try:
+            entries = json.loads(await File.read_text(self.details_path))
+            for entry in entries:
+                if entry["expire"] and entry["expire"] <= now:
+                    continue
+                details = TouchGalDetails.model_validate(entry["details"])
+                # 旧版缓存没有确认时间，按读取时确认处理
+                details.checked = details.checked or now
+                self.details.set(
+                    entry["id"],
+                    details,
+                    ttl=entry["expire"] - now if entry["expire"] else None,
+                )
+        except (ValueError, KeyError, ValidationError) as e:
+            logger.warning(f"TouchGal详情缓存读取失败，已忽略：{e}")
@@ -1,25 +1,48 @@
 import asyncio
+import json
 import math
+import time
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
 
-from astrbot.api import AstrBotConfig
+from pydantic import TypeAdapter, ValidationError
+
+from astrbot.api import AstrBotConfig, logger
+from astrbot.api.star import StarTools
 
 from ..type.exceptions import (
     InternetException,
     NoResultException,
+    RateLimitException,
     ResponseException,
 )
-from ..type.inner_models import CommandType, vndb_command_fields
+from ..type.inner_models import CommandType, current_priority, vndb_command_fields
 from ..type.outer_models import (
     VNDBCharacterResponse,
     VNDBProducerResponse,
     VNDBReleaseResponse,
     VNDBVnResponse,
 )
+from ..utils import File, LRUCache, TokenBucket
 from .http import Http
 
+T = TypeVar("T")
+
 
 class Vndb:
     kana_url = "https://api.vndb.org/kana/"
+    persist_path = (
+        StarTools.get_data_dir("astrbot_plugin_galgame_box") / "vndb_cache.json"
+    )
+
+    # 缓存的是校验后的模型，持久化时按查询类型转换
+    adapters = {
+        CommandType.VN: TypeAdapter(list[VNDBVnResponse]),
+        CommandType.CHARACTER: TypeAdapter(list[VNDBCharacterResponse]),
+        CommandType.PRODUCER: TypeAdapter(
+            tuple[list[VNDBProducerResponse], list[list[VNDBVnResponse]]]
+        ),
+    }
 
     @classmethod
     async def initialize(cls, config: AstrBotConfig):
@@ -32,6 +55,10 @@ class Vndb:
             if config.get("producerSetting", {}).get("producerVns", 9) != 0
             else 0
         )
+        # 同时查询作品的厂商数量，请求本身仍受VNDB速率限制
+        cls.producer_concurrency = max(
+            1, config.get("producerSetting", {}).get("producerConcurrency", 4)
+        )
         cls.event_rating = config.get("eventSetting", {}).get("eventRating", 75)
         cls.schedule_content = (
             config.get("scheduleSetting", {}).get("scheduleContent", "c")
@@ -40,7 +67,35 @@ class Vndb:
             0
         ]
 
-        return cls()
+        cache_setting = config.get("cacheSetting", {})
+        cls.cache_ttl = {
+            CommandType.VN: cache_setting.get("vndbVnTtl", 86400),
+            CommandType.CHARACTER: cache_setting.get("vndbCharacterTtl", 86400),
+            CommandType.PRODUCER: cache_setting.get("vndbProducerTtl", 86400),
+        }
+        cls.cache_persist = cache_setting.get("vndbCachePersist", False)
+        cls.responses = LRUCache(cache_setting.get("vndbCacheEntries", 512))
+
+        network = config.get("networkSetting", {})
+        # VNDB限制每5分钟200次请求，默认每分钟40次，超出部分排队等待
+        rate_limit = network.get("vndbRateLimit", 40)
+        cls.rate_limit = TokenBucket(rate_limit / 60, network.get("vndbBurst", 5))
+        # 被限流但网站未给出Retry-After时暂停的秒数
+        cls.rate_pause = network.get("vndbRatePause", 30)
+
+        instance = cls()
+        if cls.cache_persist:
+            await instance._load_responses()
+        return instance
+
+    async def terminate(self):
+        stats = self.rate_limit.stats()
+        logger.debug(
+            f"VNDB请求共{stats['served']}次，平均排队{stats['avg_wait']:.2f}s，"
+            f"最长排队{stats['max_wait']:.2f}s。"
+        )
+        if self.cache_persist:
+            await self._save_responses()
 
     async def request_by_vn(self, keyword: str, payload=None) -> list[VNDBVnResponse]:
         url = self.kana_url + "vn"
@@ -48,7 +103,14 @@ class Vndb:
             "filters": ["search", "=", keyword],
             "fields": vndb_command_fields["vn"],
         }
-        res = await self.http.post(url, payload)
+        return await self._cached(
+            CommandType.VN, url, payload, lambda: self._fetch_vn(url, payload, keyword)
+        )
+
+    async def _fetch_vn(
+        self, url: str, payload: dict, keyword: str
+    ) -> list[VNDBVnResponse]:
+        res = await self._post(url, payload)
         if not res:
             raise ResponseException(url)
         if not res["results"]:
@@ -64,7 +126,17 @@ class Vndb:
             "filters": ["search", "=", keyword],
             "fields": vndb_command_fields["character"],
         }
-        res = await self.http.post(url, payload)
+        return await self._cached(
+            CommandType.CHARACTER,
+            url,
+            payload,
+            lambda: self._fetch_character(url, payload, keyword),
+        )
+
+    async def _fetch_character(
+        self, url: str, payload: dict, keyword: str
+    ) -> list[VNDBCharacterResponse]:
+        res = await self._post(url, payload)
         if not res:
             raise ResponseException(url)
         if not res["results"]:
@@ -80,7 +152,17 @@ class Vndb:
             "filters": ["search", "=", keyword],
             "fields": vndb_command_fields["producer"],
         }
-        unformat_res = await self.http.post(url, pro_payload)
+        return await self._cached(
+            CommandType.PRODUCER,
+            url,
+            pro_payload,
+            lambda: self._fetch_producer(url, pro_payload, keyword),
+        )
+
+    async def _fetch_producer(
+        self, url: str, pro_payload: dict, keyword: str
+    ) -> tuple[list[VNDBProducerResponse], list[list[VNDBVnResponse]]]:
+        unformat_res = await self._post(url, pro_payload)
 
         if not unformat_res:
             raise ResponseException(url)
@@ -92,19 +174,24 @@ class Vndb:
             raise NoResultException(CommandType.PRODUCER, keyword)
         vn_url = self.kana_url + "vn"
         vn_fields = vndb_command_fields["vn_short"]
-        vns: list[list[VNDBVnResponse]] = []
-        for item in pro_res:
+        semaphore = asyncio.Semaphore(self.producer_concurrency)
+
+        # 每个厂商单独查询才能各自按评分取前producerVns个作品，合并成一个or查询只能取全体的前几个
+        async def fetch_vns(producer_id: str) -> list[VNDBVnResponse]:
             vn_payload = {
-                "filters": ["developer", "=", ["id", "=", item.id]],
+                "filters": ["developer", "=", ["id", "=", producer_id]],
                 "fields": vn_fields,
                 "sort": "rating",
                 "reverse": True,
                 "results": self.producer_vns,
             }
+            async with semaphore:
+                vns_res = (await self._post(vn_url, vn_payload))["results"]
+            return [VNDBVnResponse.model_validate(i) for i in vns_res]
 
-            vns_res = (await self.http.post(vn_url, vn_payload))["results"]
-            vns.append([VNDBVnResponse.model_validate(i) for i in vns_res])
-
+        vns: list[list[VNDBVnResponse]] = list(
+            await asyncio.gather(*(fetch_vns(item.id) for item in pro_res))
+        )
         return pro_res, vns
 
     async def request_by_id(
@@ -152,7 +239,7 @@ class Vndb:
             "fields": vndb_command_fields["character_event"],
         }
         res = await asyncio.gather(
-            self.http.post(vn_url, vn_payload), self.http.post(cha_url, cha_payload)
+            self._post(vn_url, vn_payload), self._post(cha_url, cha_payload)
         )
         _vn = [VNDBVnResponse.model_validate(i) for i in res[0]["results"]]
         _cha = [VNDBCharacterResponse.model_validate(j) for j in res[1]["results"]]
@@ -176,7 +263,7 @@ class Vndb:
             "sort": "votecount" if self.schedule_content == "b" else "rating",
             "reverse": True,
         }
-        res = await self.http.post(vn_url, vn_payload)
+        res = await self._post(vn_url, vn_payload)
         if not res or not res["results"]:
             raise NoResultException(CommandType.EVENT_TIMED, "/".join(date))
 
@@ -191,7 +278,7 @@ class Vndb:
                 ],
                 "fields": vndb_command_fields["character_event"],
             }
-            cha_res = await self.http.post(cha_url, cha_payload)
+            cha_res = await self._post(cha_url, cha_payload)
             the_cha = [
                 VNDBCharacterResponse.model_validate(j) for j in cha_res["results"]
             ]
@@ -217,7 +304,7 @@ class Vndb:
             "filters": filters,
             "fields": vndb_command_fields["character"],
         }
-        res = await self.http.post(cha_url, cha_payload)
+        res = await self._post(cha_url, cha_payload)
         if not res:
             raise NoResultException(CommandType.EVENT_TIMED, "/".join(date))
 
@@ -235,7 +322,7 @@ class Vndb:
                 "sort": "votecount" if self.schedule_content == "b" else "rating",
                 "reverse": True,
             }
-            best: dict[str, list[dict]] = await self.http.post(
+            best: dict[str, list[dict]] = await self._post(
                 vn_url, search_best_vn_payload
             )
             if not best["results"]:
@@ -252,7 +339,7 @@ class Vndb:
                         "filters": ["or", *best_vn_ids],
                         "fields": vndb_command_fields["vn_short"],
                     }
-                    vns = await self.http.post(vn_url, vn_payload)
+                    vns = await self._post(vn_url, vn_payload)
                     vn = [VNDBVnResponse.model_validate(i) for i in vns["results"]]
                     return i, vn
         except InternetException:
@@ -274,7 +361,7 @@ class Vndb:
             "fields": fields,
             "results": 1,
         }
-        res = await self.http.post(url, payload)
+        res = await self._post(url, payload)
         return [VNDBCharacterResponse.model_validate(i) for i in res["results"]]
 
     async def request_by_release(
@@ -292,5 +379,82 @@ class Vndb:
             games = [["extlink", "=", ["steam", i]] for i in id_list[start:end]]
             payload = {"filters": ["or", *games], "fields": fields, "results": 100}
 
-            res.extend((await self.http.post(url, payload))["results"])
+            res.extend((await self._post(url, payload))["results"])
         return [VNDBReleaseResponse.model_validate(i) for i in res]
+
+    async def _post(self, url: str, payload: dict) -> dict:
+        """VNDB请求按令牌桶排队，交互指令先于定时任务发出"""
+        priority = current_priority.get()
+        waited = await self.rate_limit.acquire(priority)
+        if waited >= 1:
+            stats = self.rate_limit.stats()
+            logger.debug(
+                f"VNDB请求排队{waited:.2f}s（{priority.name}），当前排队{stats['waiting']}个"
+            )
+        try:
+            # 被限流时不在Http内重试，立即暂停令牌桶
+            return await self.http.post(url, payload, retry_throttled=False)
+        except RateLimitException as e:
+            # 暂停发放令牌，排队中的请求一起等待限流解除
+            pause = e.retry_after or self.rate_pause
+            self.rate_limit.pause(pause)
+            logger.warning(f"VNDB请求被限流，{pause}秒内暂停请求")
+            raise
+
+    async def _cached(
+        self,
+        kind: CommandType,
+        url: str,
+        payload: dict,
+        fetch: Callable[[], Awaitable[T]],
+    ) -> T:
+        ttl = self.cache_ttl.get(kind, 0)
+        if ttl <= 0:
+            return await fetch()
+
+        key = self._cache_key(kind, url, payload)
+        res = self.responses.get(key)
+        if res is None:
+            res = await fetch()
+            self.responses.set(key, res, ttl=ttl)
+        return res
+
+    @staticmethod
+    def _cache_key(kind: CommandType, url: str, payload: dict) -> str:
+        canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return f"{kind.value} {url} {canonical}"
+
+    async def _save_responses(self):
+        now = time.time()
+        entries = [
+            {
+                "key": key,
+                "expire": now + remaining,
+                "value": self.adapters[CommandType(key.split(" ", 1)[0])].dump_python(
+                    value, mode="json"
+                ),
+            }
+            for key, value, remaining in self.responses.items()
+        ]
+        await File.write_text(
+            self.persist_path, json.dumps(entries, ensure_ascii=False), overwrite=True
+        )
+
+    async def _load_responses(self):
+        if not self.persist_path.exists():
+            return
+
+        now = time.time()
+        try:
+            entries = json.loads(await File.read_text(self.persist_path))
+            for entry in entries:
+                if entry["expire"] <= now:
+                    continue
+                adapter = self.adapters[CommandType(entry["key"].split(" ", 1)[0])]
+                self.responses.set(
+                    entry["key"],
+                    adapter.validate_python(entry["value"]),
+                    ttl=entry["expire"] - now,
+                )
+        except (ValueError, KeyError, ValidationError) as e:
+            logger.warning(f"VNDB查询缓存读取失败，已忽略：{e}")
@@ -25,9 +25,17 @@ class Services:
                 Vn,
                 VndbId,
             )
-            from .function import Cache
-            from .network import AnimeTrece, Downloader, Http, TouchGal, Vndb
+            from .function import AssetServer, Cache
+            from .network import (
+                AnimeTrece,
+                Client,
+                Downloader,
+                Http,
+                TouchGal,
+                Vndb,
+            )
 
+            cls._services[Client] = await Client.initialize(config)
             cls._services[Http] = await Http.initialize(config)
             cls._services[Downloader] = await Downloader.initialize(config)
             cls._services[Vndb] = await Vndb.initialize(config)
@@ -35,6 +43,7 @@ class Services:
             cls._services[AnimeTrece] = await AnimeTrece.initialize(config)
 
             cls._services[Cache] = await Cache.initialize(config)
+            cls._services[AssetServer] = await AssetServer.initialize(config)
 
             cls._services[Vn] = await Vn.initialize(config)
             cls._services[Character] = await Character.initialize(config)
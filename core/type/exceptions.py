@@ -32,6 +32,12 @@ class InternetException(Tips):
         super().__init__(f"请求网络失败：{url}，请检查【安全配置】是否错误")
 
 
+class RateLimitException(InternetException):
+    def __init__(self, url: str, retry_after: float = 0):
+        self.retry_after = retry_after
+        Tips.__init__(self, f"请求过于频繁，网站已限流，请稍后再试：{url}")
+
+
 class AuthorityException(Tips):
     def __init__(self, msg: str):
         super().__init__(
@@ -39,6 +45,16 @@ class AuthorityException(Tips):
         )
 
 
+class CircuitOpenException(Tips):
+    def __init__(self, host: str):
+        super().__init__(f"网站暂时无法访问，请稍后再试：{host}")
+
+
+class ImageTooLargeException(Tips):
+    def __init__(self, detail: str):
+        super().__init__(f"图片超过大小限制：{detail}")
+
+
 class ResponseException(Tips):
     def __init__(self, url: str):
         super().__init__(f"请求结果为空，网站返回内容错误：{url}")
@@ -54,6 +70,11 @@ class NoCacheException(Tips):
         super().__init__(f"缓存不存在：{path}")
 
 
+class RenderBusyException(Tips):
+    def __init__(self, waiting: int):
+        super().__init__(f"渲染任务过多，请稍后再试：当前排队{waiting}个")
+
+
 class SettingException(Tips):
     def __init__(self, setting: str):
         super().__init__(f"插件配置项错误：{setting}")
@@ -1,5 +1,6 @@
 from asyncio import Event
-from enum import Enum
+from contextvars import ContextVar
+from enum import Enum, IntEnum
 from typing import TypeAlias
 
 from pydantic import BaseModel, ConfigDict
@@ -25,11 +26,67 @@ class CommandType(Enum):
     EVENT_TIMED = "event_timed"
 
 
+class Priority(IntEnum):
+    """数值越小越优先"""
+
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+# 后台任务（预取、定时推送）在自己的上下文中设置为BACKGROUND
+current_priority: ContextVar[Priority] = ContextVar(
+    "current_priority", default=Priority.INTERACTIVE
+)
+
+
+class Fetched(BaseModel):
+    """带校验信息的请求结果，not_modified为True时body为空"""
+
+    body: bytes | None = None
+    etag: str = ""
+    last_modified: str = ""
+    not_modified: bool = False
+
+    @staticmethod
+    def conditional_headers(etag: str, last_modified: str) -> dict[str, str]:
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    @classmethod
+    def from_response(cls, status: int, headers, body: bytes | None) -> "Fetched":
+        return cls(
+            body=None if status == 304 else body,
+            etag=headers.get("ETag", ""),
+            last_modified=headers.get("Last-Modified", ""),
+            not_modified=status == 304,
+        )
+
+
 class TouchGalDetails(BaseModel):
     third_info: list[str]
     previews: list[str]
     description: str
     title: str
+    # 页面的校验信息与上次确认时间，过期后用条件请求确认是否变化
+    etag: str = ""
+    last_modified: str = ""
+    checked: float = 0
+
+
+class CacheMeta(BaseModel):
+    """图片缓存的元数据，以来源URL的哈希命名，blob为图片内容哈希"""
+
+    source: str = ""
+    blob: str = ""
+    mime: str = "image/jpeg"
+    size: int = 0
+    etag: str = ""
+    last_modified: str = ""
+    checked: float = 0
 
 
 class RecommendCache(BaseModel):
@@ -56,6 +113,9 @@ template_list = {
     "event_timed": "template3.html",
 }
 
+# 嵌入模板前缩小到的宽度（像素），分别对应卡片、主图、预览图
+image_sizes = {"card": 480, "main": 640, "preview": 720}
+
 vndb_command_fields = {
     "vn": "id,average,rating,released,length_minutes,platforms,aliases,developers{id,original,name},titles{lang,title,official},image{url},alttitle,title",
     "character": "id,name,aliases,sex,birthday,waist,hips,bust,blood_type,weight,height,cup,original,image{url},vns{id,alttitle,title}",
@@ -85,5 +145,8 @@ mime_type = {
     "jpg": "image/jpeg",
     "jpeg": "image/jpeg",
     "avif": "image/avif",
+    "webp": "image/webp",
     "ttf": "font/ttf",
+    "woff": "font/woff",
+    "woff2": "font/woff2",
 }
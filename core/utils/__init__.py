@@ -1,7 +1,29 @@
+from .circuit_breaker import BreakerState, CircuitBreaker
 from .file import File
+from .font import Font
 from .html_handler import HTMLHandler
-from .image import Image
+from .image import Image, ImageStream
+from .lru import LRUCache
 from .only_sender_filter import OnlySenderFilter
+from .priority_limiter import PriorityLimiter
+from .renderer import PillowRenderer
+from .single_flight import SingleFlight
 from .splicer import Splicer
+from .token_bucket import TokenBucket
 
-__all__ = ["File", "HTMLHandler", "Image", "Splicer", "OnlySenderFilter"]
+__all__ = [
+    "BreakerState",
+    "CircuitBreaker",
+    "File",
+    "Font",
+    "HTMLHandler",
+    "Image",
+    "ImageStream",
+    "LRUCache",
+    "PillowRenderer",
+    "PriorityLimiter",
+    "SingleFlight",
+    "Splicer",
+    "TokenBucket",
+    "OnlySenderFilter",
+]
@@ -0,0 +1,66 @@
+import time
+from collections.abc import Hashable
+from enum import Enum
+
+
+class BreakerState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """按key统计连续失败，达到阈值后熔断，冷却时间过后放行一次试探请求"""
+
+    def __init__(self, threshold: int = 5, recovery: float = 30):
+        # 阈值为0表示不熔断
+        self.threshold = threshold
+        self.recovery = recovery
+        self._failures: dict[Hashable, int] = {}
+        self._opened: dict[Hashable, float] = {}
+        self._probing: dict[Hashable, float] = {}
+
+    def state(self, key: Hashable) -> BreakerState:
+        opened = self._opened.get(key)
+        if opened is None:
+            return BreakerState.CLOSED
+        if time.monotonic() - opened >= self.recovery:
+            return BreakerState.HALF_OPEN
+        return BreakerState.OPEN
+
+    def allow(self, key: Hashable) -> bool:
+        state = self.state(key)
+        if state is BreakerState.CLOSED:
+            return True
+        now = time.monotonic()
+        if (
+            state is BreakerState.HALF_OPEN
+            and now - self._probing.get(key, float("-inf")) >= self.recovery
+        ):
+            # 半开状态只放行一个试探请求，试探请求没有结果时冷却后再放行
+            self._probing[key] = now
+            return True
+        return False
+
+    def success(self, key: Hashable):
+        self._failures.pop(key, None)
+        self._opened.pop(key, None)
+        self._probing.pop(key, None)
+
+    def failure(self, key: Hashable) -> bool:
+        """记录一次失败，返回本次是否触发熔断"""
+        if self.threshold <= 0:
+            return False
+        self._probing.pop(key, None)
+        count = self._failures.get(key, 0) + 1
+        self._failures[key] = count
+        if key in self._opened or count >= self.threshold:
+            self._opened[key] = time.monotonic()
+            return True
+        return False
+
+    def states(self) -> dict[Hashable, dict]:
+        return {
+            key: {"state": self.state(key).value, "failures": count}
+            for key, count in self._failures.items()
+        }
@@ -45,11 +45,11 @@ class File:
             return True
 
     @staticmethod
-    async def write_text(path: str | Path, data: str) -> bool:
-        if os.path.exists(path):
+    async def write_text(path: str | Path, data: str, overwrite: bool = False) -> bool:
+        if not overwrite and os.path.exists(path):
             return False
 
-        async with aiofiles.open(path, "w") as f:
+        async with aiofiles.open(path, "w", encoding="utf-8") as f:
             await f.write(data)
             return True
 
@@ -0,0 +1,56 @@
+import asyncio
+import importlib.util
+from io import BytesIO
+
+# 模板中可能由Jinja生成的数字、符号
+BASE_CHARS = {chr(i) for i in range(0x20, 0x7F)}
+
+
+class Font:
+    @staticmethod
+    def available() -> bool:
+        return importlib.util.find_spec("fontTools") is not None
+
+    @staticmethod
+    def flavor() -> str:
+        return "woff2" if importlib.util.find_spec("brotli") is not None else "woff"
+
+    @classmethod
+    def collect_chars(cls, value, chars: set[str] | None = None) -> set[str]:
+        """收集数据中实际会显示的字符，跳过图片等链接"""
+        chars = set(BASE_CHARS) if chars is None else chars
+        if isinstance(value, str):
+            if not value.startswith(("data:", "http://", "https://", "file://")):
+                chars.update(value)
+        elif isinstance(value, dict):
+            for v in value.values():
+                cls.collect_chars(v, chars)
+        elif isinstance(value, (list, tuple)):
+            for v in value:
+                cls.collect_chars(v, chars)
+        return chars
+
+    @classmethod
+    def subset(cls, font_data: bytes, chars: set[str]) -> bytes:
+        from fontTools import subset
+        from fontTools.ttLib import TTFont
+
+        options = subset.Options()
+        options.flavor = cls.flavor()
+        options.notdef_outline = True
+
+        font = TTFont(BytesIO(font_data))
+        try:
+            subsetter = subset.Subsetter(options)
+            subsetter.populate(text="".join(chars))
+            subsetter.subset(font)
+
+            buffer = BytesIO()
+            subset.save_font(font, buffer, options)
+            return buffer.getvalue()
+        finally:
+            font.close()
+
+    @classmethod
+    async def subset_async(cls, font_data: bytes, chars: set[str]) -> bytes:
+        return await asyncio.to_thread(cls.subset, font_data, chars)
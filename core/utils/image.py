@@ -2,9 +2,16 @@ import asyncio
 from io import BytesIO
 
 from PIL import Image as PILImage
+from PIL import ImageFile
+
+from ..type.exceptions import ImageTooLargeException
 
 
 class Image:
+    @staticmethod
+    def is_jpeg(image_data: bytes) -> bool:
+        return image_data[:3] == b"\xff\xd8\xff"
+
     @classmethod
     def image2jpg(cls, image_data: bytes) -> bytes:
 
@@ -63,3 +70,117 @@ class Image:
     @classmethod
     async def image2jpg_async(cls, image_data: bytes) -> bytes:
         return await asyncio.to_thread(cls.image2jpg, image_data)
+
+    @classmethod
+    def resize(cls, image_data: bytes, width: int) -> bytes:
+        """按宽度等比缩小为JPEG，本身不超过该宽度时原样返回"""
+        img = PILImage.open(BytesIO(image_data))
+        try:
+            if img.width <= width:
+                return image_data
+
+            size = (width, max(1, img.height * width // img.width))
+            # JPEG在解码阶段直接按比例缩小，避免解码完整尺寸
+            img.draft("RGB", size)
+            source = img.convert("RGBA") if img.mode in ("P", "LA") else img
+            return cls._image2jpg_simple(source.resize(size, PILImage.LANCZOS))
+        finally:
+            img.close()
+
+    @classmethod
+    async def resize_async(cls, image_data: bytes, width: int) -> bytes:
+        return await asyncio.to_thread(cls.resize, image_data, width)
+
+    @classmethod
+    def compress(
+        cls,
+        image_data: bytes,
+        max_bytes: int = 0,
+        max_width: int = 0,
+        max_height: int = 0,
+        fmt: str = "JPEG",
+    ) -> bytes:
+        """限制分辨率后逐步降低质量重新编码，尽量不超过目标大小，0为不限制"""
+        img = PILImage.open(BytesIO(image_data))
+        try:
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            if max_width or max_height:
+                img.thumbnail(
+                    (max_width or img.width, max_height or img.height), PILImage.LANCZOS
+                )
+
+            result = b""
+            for _ in range(3):
+                for quality in (90, 80, 70, 60, 50):
+                    buffer = BytesIO()
+                    img.save(buffer, fmt, quality=quality)
+                    result = buffer.getvalue()
+                    if not max_bytes or len(result) <= max_bytes:
+                        return result
+                # 最低质量仍然过大时缩小尺寸再试
+                size = (max(1, img.width * 4 // 5), max(1, img.height * 4 // 5))
+                img = img.resize(size, PILImage.LANCZOS)
+            return result
+        finally:
+            img.close()
+
+    @classmethod
+    async def compress_async(
+        cls,
+        image_data: bytes,
+        max_bytes: int = 0,
+        max_width: int = 0,
+        max_height: int = 0,
+        fmt: str = "JPEG",
+    ) -> bytes:
+        return await asyncio.to_thread(
+            cls.compress, image_data, max_bytes, max_width, max_height, fmt
+        )
+
+
+class ImageStream:
+    """边下载边解析图片头，超过字节或像素上限时立即中止，不必先读完整个响应"""
+
+    # 超过该长度仍无法识别图片头时不再解析，交给后续解码处理
+    header_limit = 1024 * 1024
+
+    def __init__(self, max_bytes: int = 0, max_pixels: int = 0):
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.size = 0
+        self._chunks: list[bytes] = []
+        self._parser: ImageFile.Parser | None = (
+            ImageFile.Parser() if max_pixels > 0 else None
+        )
+
+    def check_length(self, length: int | None):
+        if length and self.max_bytes and length > self.max_bytes:
+            raise ImageTooLargeException(f"{length}字节")
+
+    def feed(self, chunk: bytes):
+        self.size += len(chunk)
+        self.check_length(self.size)
+        self._chunks.append(chunk)
+        if self._parser is None:
+            return
+
+        try:
+            self._parser.feed(chunk)
+        except PILImage.DecompressionBombError as e:
+            raise ImageTooLargeException("像素过多") from e
+        except Exception:
+            # 无法解析的内容不在这里处理
+            self._parser = None
+            return
+        image = self._parser.image
+        if image is not None:
+            # 只需要图片头中的尺寸，不继续解码
+            self._parser = None
+            if image.width * image.height > self.max_pixels:
+                raise ImageTooLargeException(f"{image.width}x{image.height}")
+        elif self.size > self.header_limit:
+            self._parser = None
+
+    def getvalue(self) -> bytes:
+        return b"".join(self._chunks)
@@ -0,0 +1,82 @@
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Any
+
+
+class LRUCache:
+    """按容量淘汰的内存缓存，容量单位由写入时的size决定（字节数或条目数）"""
+
+    def __init__(self, max_size: int, ttl: float = 0):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+
+        # key -> (value, size, expire_at)
+        self._data: OrderedDict[Hashable, tuple[Any, int, float]] = OrderedDict()
+        self._size = 0
+
+    def get(self, key: Hashable, default=None):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+
+        value, _, expire_at = item
+        if expire_at and expire_at < time.monotonic():
+            self.pop(key)
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value, size: int = 1, ttl: float | None = None):
+        if self.max_size <= 0 or size > self.max_size:
+            return
+
+        self.pop(key)
+        ttl = self.ttl if ttl is None else ttl
+        self._data[key] = (value, size, time.monotonic() + ttl if ttl > 0 else 0)
+        self._size += size
+        while self._size > self.max_size:
+            _, (_, old_size, _) = self._data.popitem(last=False)
+            self._size -= old_size
+
+    def pop(self, key: Hashable, default=None):
+        item = self._data.pop(key, None)
+        if item is None:
+            return default
+        self._size -= item[1]
+        return item[0]
+
+    def clear(self):
+        self._data.clear()
+        self._size = 0
+
+    def items(self) -> list[tuple[Hashable, Any, float]]:
+        """返回 (key, value, 剩余有效秒数)，剩余为0表示不会过期，用于持久化"""
+        now = time.monotonic()
+        return [
+            (key, value, expire_at - now if expire_at else 0)
+            for key, (value, _, expire_at) in self._data.items()
+            if not expire_at or expire_at > now
+        ]
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._data),
+            "size": self._size,
+        }
+
+    def __contains__(self, key: Hashable) -> bool:
+        item = self._data.get(key)
+        return item is not None and not (item[2] and item[2] < time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self._data)
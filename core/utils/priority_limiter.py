@@ -0,0 +1,82 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+
+class PriorityLimiter:
+    """限制并发数量，排队时优先级数值小的先执行，同优先级先到先得"""
+
+    def __init__(self, concurrency: int, max_waiting: int = 0):
+        self.concurrency = max(1, concurrency)
+        # 0表示不限制排队数量
+        self.max_waiting = max_waiting
+        self._running = 0
+        self._waiters: list[list] = []
+        self._order = itertools.count()
+
+        self._served = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def full(self) -> bool:
+        return 0 < self.max_waiting <= len(self._waiters)
+
+    def reject(self):
+        self._rejected += 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 0) -> AsyncIterator[float]:
+        """获取一个执行名额，返回排队等待的秒数"""
+        start = time.monotonic()
+        await self._acquire(priority)
+        waited = time.monotonic() - start
+        self._served += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        try:
+            yield waited
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: int):
+        if self._running < self.concurrency and not self._waiters:
+            self._running += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._order), future]
+        heapq.heappush(self._waiters, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 名额已经转交过来，取消时需要归还
+                self._release()
+            elif entry in self._waiters:
+                # 已被取消的等待者可能在恢复前就被_release跳过并移出队列
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def _release(self):
+        # 名额直接转交给下一个等待者，运行数量不变
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._running -= 1
+
+    def stats(self) -> dict:
+        return {
+            "running": self._running,
+            "waiting": len(self._waiters),
+            "served": self._served,
+            "rejected": self._rejected,
+            "avg_wait": self._wait_total / self._served if self._served else 0.0,
+            "max_wait": self._wait_max,
+        }
@@ -0,0 +1,337 @@
+import asyncio
+import base64
+from collections.abc import Callable
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image as PILImage
+from PIL import ImageDraw, ImageFont
+
+Op = Callable[[PILImage.Image, ImageDraw.ImageDraw], None]
+
+
+class PillowRenderer:
+    """按模板布局直接用Pillow绘制，不依赖html_renderer"""
+
+    width = 1280
+    margin = 32
+    padding = 32
+    gutter = 24
+
+    white = (255, 255, 255)
+    info = (147, 187, 194)
+
+    def __init__(
+        self,
+        font_path: str | Path,
+        bg_path: str | Path,
+        err_path: str | Path,
+        images: dict[str, bytes] | None = None,
+    ):
+        self.font_path = str(font_path)
+        self.bg_path = bg_path
+        self.err_path = err_path
+        # 非data URI的图片链接需要调用方预先下载好
+        self.images = images or {}
+
+        self._fonts: dict[int, ImageFont.FreeTypeFont] = {}
+        self._ops: list[Op] = []
+        self._layouts = {
+            "template1.html": self._cards_page,
+            "template2.html": self._blocks_page,
+            "template3.html": self._detail_page,
+        }
+
+    def render(self, template: str, data: dict, quality: int = 90) -> bytes:
+        if template not in self._layouts:
+            raise ValueError(f"不支持本地绘制的模板：{template}")
+
+        left = self.margin + self.padding
+        content_width = self.width - 2 * left
+        top = self.margin * 2
+        height = self._layouts[template](data, left, top, content_width) + top * 2
+
+        canvas = self._background(height)
+        self._panel(
+            canvas,
+            (self.margin, self.margin, self.width - self.margin, height - self.margin),
+            (0, 0, 0, 128),
+            self.padding,
+        )
+        draw = ImageDraw.Draw(canvas)
+        for op in self._ops:
+            op(canvas, draw)
+
+        buffer = BytesIO()
+        canvas.convert("RGB").save(buffer, "JPEG", quality=quality)
+        return buffer.getvalue()
+
+    async def render_async(self, template: str, data: dict, quality: int = 90) -> bytes:
+        return await asyncio.to_thread(self.render, template, data, quality)
+
+    def _cards_page(self, data: dict, x: int, y: int, w: int) -> int:
+        cards = data.get("cards", [])
+        top = y
+        y += self._text(
+            data.get("title") or f"搜索到{len(cards)}条结果",
+            x,
+            y,
+            w,
+            48,
+            self.info,
+            True,
+        )
+        y += self._gap(x, y, w)
+        y += self._cards(cards, x, y, w, 3, 20, 25)
+        return y - top
+
+    def _blocks_page(self, data: dict, x: int, y: int, w: int) -> int:
+        blocks = data.get("blocks", [])
+        title = data.get("title")
+        top = y
+        if isinstance(title, dict):
+            y += self._column_info(title, x, y, w, 48)
+        else:
+            y += self._text(
+                title or f"搜索到{len(blocks)}条结果", x, y, w, 48, self.info, True
+            )
+        y += self._gap(x, y, w)
+
+        for block in blocks:
+            if not block.get("column_info"):
+                continue
+            y += self.gutter
+            index = len(self._ops)
+            inner = self.padding // 2
+            height = inner
+            column_info = block["column_info"]
+            if isinstance(column_info, dict):
+                height += self._column_info(
+                    column_info, x + inner, y + height, w - 2 * inner, 32
+                )
+            else:
+                height += self._text(
+                    column_info,
+                    x + inner,
+                    y + height,
+                    w - 2 * inner,
+                    32,
+                    self.info,
+                    True,
+                )
+            height += self._cards(
+                block.get("cards", []), x + inner, y + height, w - 2 * inner, 3, 20, 25
+            )
+            box = (x, y, x + w, y + height)
+            # 区块底色需先于区块内容绘制
+            self._ops.insert(
+                index,
+                lambda c, d, box=box: self._panel(c, box, (0, 0, 0, 26), self.padding),
+            )
+            y += height
+        return y - top
+
+    def _detail_page(self, data: dict, x: int, y: int, w: int) -> int:
+        top = y
+        if data.get("title"):
+            y += self._text(data["title"], x, y, w, 48, self.info, True)
+            y += self._gap(x, y, w)
+        y += self._text(data.get("subtitle", ""), x, y, w, 48, self.info, True)
+        y += self.gutter
+
+        image_width = (w - self.gutter) // 3
+        detail_x = x + image_width + self.gutter
+        detail_width = w - image_width - self.gutter
+        image_height = self._image(data.get("main_image"), x, y, image_width)
+        detail_height = self._text("基本信息", detail_x, y, detail_width, 32)
+        detail_height += self._text(
+            data.get("info", []), detail_x, y + detail_height, detail_width, 24
+        )
+        y += max(image_height, detail_height) + self.gutter
+
+        if data.get("desc"):
+            y += self._text("简介", x, y, w, 32)
+            y += self._text(data["desc"], x, y, w, 24, center=True)
+            y += self.gutter
+        if data.get("previews"):
+            y += self._text("游戏截图", x, y, w, 32)
+            y += self._grid(
+                [
+                    lambda px, py, pw, src=src: self._image(src, px, py, pw)
+                    for src in data["previews"]
+                ],
+                x,
+                y,
+                w,
+                2,
+            )
+        if data.get("cards"):
+            y += self._text(data.get("cards_title", ""), x, y, w, 32)
+            y += self._cards(data["cards"], x, y, w, 4, 15, 20)
+        return y - top
+
+    def _cards(
+        self,
+        cards: list[dict],
+        x: int,
+        y: int,
+        w: int,
+        columns: int,
+        text_size: int,
+        subtitle_size: int,
+    ) -> int:
+        def card_builder(card: dict):
+            def build(cx: int, cy: int, cw: int) -> int:
+                height = self._image(card.get("image"), cx, cy, cw)
+                height += 8
+                if card.get("subtitle"):
+                    height += self._text(
+                        card["subtitle"],
+                        cx,
+                        cy + height,
+                        cw,
+                        subtitle_size,
+                        center=True,
+                    )
+                if card.get("desc"):
+                    height += self._text(card["desc"], cx, cy + height, cw, text_size)
+                return height
+
+            return build
+
+        return self._grid([card_builder(card) for card in cards], x, y, w, columns)
+
+    def _grid(
+        self,
+        builders: list[Callable[[int, int, int], int]],
+        x: int,
+        y: int,
+        w: int,
+        columns: int,
+    ) -> int:
+        cell = (w - self.gutter * (columns - 1)) // columns
+        height = 0
+        for start in range(0, len(builders), columns):
+            row = builders[start : start + columns]
+            # 不满一行时居中排列
+            offset = (w - len(row) * cell - (len(row) - 1) * self.gutter) // 2
+            heights = [
+                build(
+                    x + offset + i * (cell + self.gutter),
+                    y + height + self.gutter,
+                    cell,
+                )
+                for i, build in enumerate(row)
+            ]
+            height += max(heights) + self.gutter
+        return height + (self.gutter if builders else 0)
+
+    def _column_info(self, value: dict, x: int, y: int, w: int, size: int) -> int:
+        image_width = w // 4
+        image_height = self._image(value.get("image"), x, y + self.gutter, image_width)
+        text_x = x + image_width + self.gutter
+        text_width = w - image_width - self.gutter
+        text_height = self._measure(value.get("text", []), text_width, size)
+        # 文字相对图片垂直居中
+        text_y = y + self.gutter + max(0, (image_height - text_height) // 2)
+        self._text(
+            value.get("text", []), text_x, text_y, text_width, size, self.info, True
+        )
+        return max(image_height, text_height) + self.gutter * 2
+
+    def _gap(self, x: int, y: int, w: int) -> int:
+        box = (x + w // 10, y, x + w - w // 10, y + 4)
+        self._ops.append(lambda c, d: d.rectangle(box, fill=self.white))
+        return 4
+
+    def _text(
+        self,
+        value: str | list[str],
+        x: int,
+        y: int,
+        w: int,
+        size: int,
+        color: tuple[int, int, int] = white,
+        center: bool = False,
+    ) -> int:
+        font = self._font(size)
+        line_height = int(size * 1.4)
+        lines = self._wrap(value, font, w)
+        for i, line in enumerate(lines):
+            lx = x + (w - font.getlength(line)) / 2 if center else x
+            ly = y + i * line_height
+            self._ops.append(
+                lambda c, d, lx=lx, ly=ly, line=line: d.text(
+                    (lx, ly), line, font=font, fill=color
+                )
+            )
+        return len(lines) * line_height
+
+    def _measure(self, value: str | list[str], w: int, size: int) -> int:
+        return len(self._wrap(value, self._font(size), w)) * int(size * 1.4)
+
+    @staticmethod
+    def _wrap(
+        value: str | list[str], font: ImageFont.FreeTypeFont, width: int
+    ) -> list[str]:
+        text = "\n".join(value) if isinstance(value, list) else str(value)
+        lines = []
+        for paragraph in text.replace("<br>", "\n").split("\n"):
+            line = ""
+            for char in paragraph:
+                if line and font.getlength(line + char) > width:
+                    lines.append(line)
+                    line = ""
+                line += char
+            lines.append(line)
+        return lines
+
+    def _image(self, src: str | None, x: int, y: int, w: int) -> int:
+        img = self._load(src)
+        size = (w, max(1, img.height * w // img.width))
+        img = img.resize(size, PILImage.LANCZOS)
+        self._ops.append(lambda c, d: c.alpha_composite(img, (x, y)))
+        return size[1]
+
+    def _load(self, src: str | None) -> PILImage.Image:
+        try:
+            if src and src.startswith("data:"):
+                buffer = base64.b64decode(src.split(",", 1)[1])
+            elif src and src in self.images:
+                buffer = self.images[src]
+            else:
+                buffer = None
+            if buffer:
+                return PILImage.open(BytesIO(buffer)).convert("RGBA")
+        except Exception:
+            pass
+        return PILImage.open(self.err_path).convert("RGBA")
+
+    def _font(self, size: int) -> ImageFont.FreeTypeFont:
+        if size not in self._fonts:
+            self._fonts[size] = ImageFont.truetype(self.font_path, size)
+        return self._fonts[size]
+
+    def _background(self, height: int) -> PILImage.Image:
+        with PILImage.open(self.bg_path) as bg:
+            # 等同background-size: cover，从左上角裁剪
+            scale = max(self.width / bg.width, height / bg.height)
+            size = (int(bg.width * scale) + 1, int(bg.height * scale) + 1)
+            return (
+                bg.convert("RGBA")
+                .resize(size, PILImage.LANCZOS)
+                .crop((0, 0, self.width, height))
+            )
+
+    @staticmethod
+    def _panel(
+        canvas: PILImage.Image,
+        box: tuple[int, int, int, int],
+        fill: tuple[int, int, int, int],
+        radius: int,
+    ):
+        layer = PILImage.new("RGBA", (box[2] - box[0], box[3] - box[1]), (0, 0, 0, 0))
+        ImageDraw.Draw(layer).rounded_rectangle(
+            (0, 0, layer.width - 1, layer.height - 1), radius, fill=fill
+        )
+        canvas.alpha_composite(layer, (box[0], box[1]))
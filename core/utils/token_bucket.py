@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+from .priority_limiter import PriorityLimiter
+
+
+class TokenBucket:
+    """按固定速率发放令牌，允许短时突发，排队时优先级数值小的先拿到令牌"""
+
+    def __init__(self, rate: float, capacity: int = 1):
+        # 每秒发放的令牌数，0表示不限速
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        # 同一时间只有队首在等待令牌，队列顺序由优先级决定
+        self._queue = PriorityLimiter(1)
+
+        self._served = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def pause(self, seconds: float):
+        """网站要求降速时暂停发放令牌，已攒下的令牌作废"""
+        if self.rate <= 0:
+            return
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+        self._updated = self._paused_until
+
+    async def acquire(self, priority: int = 0) -> float:
+        """取得一个令牌，返回排队等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+
+        start = time.monotonic()
+        async with self._queue.slot(priority):
+            while (wait := self._wait(time.monotonic())) > 0:
+                await asyncio.sleep(wait)
+            self._tokens -= 1
+        waited = time.monotonic() - start
+        self._served += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        return waited
+
+    def _wait(self, now: float) -> float:
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def stats(self) -> dict:
+        queue = self._queue.stats()
+        return {
+            "tokens": self._tokens,
+            "paused": max(0.0, self._paused_until - time.monotonic()),
+            "waiting": queue["waiting"] + queue["running"],
+            "served": self._served,
+            "avg_wait": self._wait_total / self._served if self._served else 0.0,
+            "max_wait": self._wait_max,
+        }
@@ -10,8 +10,8 @@ from astrbot.core.platform.message_session import MessageSession
 from astrbot.core.star.filter.command import GreedyStr
 
 from .core.command import *
-from .core.function.cache import Cache
-from .core.network import Downloader, Http
+from .core.function import AssetServer, Cache
+from .core.network import Client, Http, TouchGal, Vndb
 from .core.services import Services
 from .core.type.exceptions import EarlyReturn, Tips
 
@@ -33,9 +33,12 @@ class GalgameBoxPlugin(Star):
     async def terminate(self):
         """可选择实现异步的插件销毁方法，当插件被卸载/停用时会调用。"""
         await self._cancel_gal_event()
-        await Services.get(Downloader).terminate()
-        await Services.get(Http).terminate()
-        await Services.get(Cache).terminate()
+        for service in (Vndb, TouchGal, Http, Client, Cache, AssetServer):
+            try:
+                await Services.get(service).terminate()
+            except Exception as e:
+                # 某个服务关闭失败时继续关闭其余服务，避免连接与缓存未释放
+                logger.warning(f"{service.__name__}关闭失败：{e}")
 
     @filter.command_group("旮旯", alias={"gal", "GAL"})
     async def gal_box(self, event: AstrMessageEvent):
@@ -126,19 +129,24 @@ class GalgameBoxPlugin(Star):
                     )
                 else:
                     for group in self.push_list:
-                        await self.ctx.send_message(group, MessageChain().url_image(vn))
+                        await self.ctx.send_message(group, self._image_chain(vn))
                 if isinstance(cha, Exception):
                     await anext(
                         self._handle_command_exception(None, cha, "生日推送失败：")
                     )
                 else:
                     for group in self.push_list:
-                        await self.ctx.send_message(
-                            group, MessageChain().url_image(cha)
-                        )
+                        await self.ctx.send_message(group, self._image_chain(cha))
         except Exception as e:
             await anext(self._handle_command_exception(None, e))
 
+    @staticmethod
+    def _image_chain(image: str) -> MessageChain:
+        # 本地绘制的结果是文件路径
+        if image.startswith("http"):
+            return MessageChain().url_image(image)
+        return MessageChain().file_image(image)
+
     async def _register_push_task(self):
         if not self.push_list:
             logger.warning("推送白名单为空，定时任务不会执行！")